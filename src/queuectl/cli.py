@@ -5,9 +5,10 @@ import os
 import subprocess
 import sys
 import time
-import uuid
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 from pathlib import Path
-from typing import Optional
+from typing import BinaryIO, Iterable, Iterator, Optional, Union
 
 import typer
 from rich.console import Console
@@ -16,8 +17,14 @@ from rich.table import Table
 from . import __version__
 from .config import ConfigService
 from .storage import Storage
-from .worker import run_worker
-from .utils import terminate_process
+from .supervisor import Scaler, Supervisor
+from .worker import AFFINITY_ENV, WorkerPool, new_worker_id, parse_affinity, run_worker
+from .utils import dump_json, load_json, request_stop, terminate_process
+
+try:
+    import ijson
+except ImportError:  # pragma: no cover - optional dependency
+    ijson = None
 
 
 console = Console()
@@ -31,24 +38,53 @@ app.add_typer(worker_app, name="worker")
 app.add_typer(dlq_app, name="dlq")
 app.add_typer(config_app, name="config")
 
+DEFAULT_PAGE_SIZE = 200
+
+NDJSON_SUFFIXES = {".jsonl", ".ndjson"}
+JSON_ERRORS: tuple = (json.JSONDecodeError,) if ijson is None else (json.JSONDecodeError, ijson.JSONError)
 
-def _load_payload(payload: Optional[str], file: Optional[Path]) -> dict:
+
+@contextmanager
+def _load_payload(payload: Optional[str], file: Optional[Path]) -> Iterator[Union[dict, Iterable[dict]]]:
     if file:
         if payload:
             raise typer.BadParameter("Provide either payload JSON or --file, not both")
-        with file.open("r", encoding="utf-8") as fh:
-            return json.load(fh)
+        with file.open("rb") as fh:
+            if file.suffix in NDJSON_SUFFIXES:
+                yield _iter_ndjson(fh, file)
+            else:
+                yield _read_json(fh)
+        return
     if payload:
-        return json.loads(payload)
+        yield load_json(payload)
+        return
     if not sys.stdin.isatty():
-        try:
-            data = json.load(sys.stdin)
-            return data
-        except json.JSONDecodeError as exc:  # pragma: no cover
-            raise typer.BadParameter("Provided JSON payload via stdin is invalid") from exc
+        yield _read_json(sys.stdin.buffer)
+        return
     raise typer.BadParameter("No job payload provided. Use JSON, --file, or --command option.")
 
 
+def _read_json(fh: BinaryIO) -> Union[dict, Iterable[dict]]:
+    # Skip insignificant whitespace so the first byte tells objects from arrays.
+    while fh.peek(1)[:1] in (b" ", b"\t", b"\r", b"\n"):
+        fh.read(1)
+    if fh.peek(1)[:1] == b"[" and ijson is not None:
+        # Stream arrays of jobs instead of building the whole document in memory.
+        return ijson.items(fh, "item", use_float=True)
+    return load_json(fh.read())
+
+
+def _iter_ndjson(fh: BinaryIO, file: Path) -> Iterator[dict]:
+    for lineno, line in enumerate(fh, start=1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            yield load_json(line)
+        except json.JSONDecodeError as exc:
+            raise typer.BadParameter(f"Invalid JSON on line {lineno} of {file}") from exc
+
+
 def _build_job_from_options(
     *,
     job_id: Optional[str],
@@ -72,12 +108,47 @@ def _build_job_from_options(
         payload["available_at"] = available_at
     if metadata is not None:
         try:
-            payload["metadata"] = json.loads(metadata)
+            payload["metadata"] = load_json(metadata)
         except json.JSONDecodeError as exc:
             raise typer.BadParameter("--metadata must be valid JSON") from exc
     return payload
 
 
+def _check_affinity() -> None:
+    # Workers parse it again after forking, where an error would go unseen.
+    try:
+        parse_affinity(os.environ.get(AFFINITY_ENV))
+    except ValueError as exc:
+        raise typer.BadParameter(str(exc)) from exc
+
+
+def _spawn_worker(use_async: bool = False, index: int = 0) -> int:
+    if sys.platform == "win32":
+        cmd = [sys.executable, "-m", "queuectl.worker_process"]
+        if use_async:
+            cmd.append("--async")
+        return subprocess.Popen(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL).pid
+
+    # Fork from the already-initialised CLI instead of paying a fresh
+    # interpreter start-up and import of queuectl for every worker.
+    pid = os.fork()
+    if pid:
+        return pid
+    exit_code = 0
+    try:
+        os.setsid()
+        devnull = os.open(os.devnull, os.O_RDWR)
+        for fd in (0, 1, 2):
+            os.dup2(devnull, fd)
+        # Named in the child: the id embeds the worker's own pid, which
+        # stays unique after this CLI process exits.
+        run_worker(use_async=use_async, index=index)
+    except BaseException:
+        exit_code = 1
+    finally:
+        os._exit(exit_code)
+
+
 @app.command()
 def version() -> None:
     """Show the queuectl version."""
@@ -91,7 +162,12 @@ def enqueue(
         None,
         help="Job payload as JSON string. If omitted, use --file or pipe JSON via stdin.",
     ),
-    file: Optional[Path] = typer.Option(None, "--file", "-f", help="Path to JSON file with job payload"),
+    file: Optional[Path] = typer.Option(
+        None,
+        "--file",
+        "-f",
+        help="Path to a JSON job or array of jobs, or a .jsonl file with one job per line",
+    ),
     job_id: Optional[str] = typer.Option(None, "--id", help="Job identifier (use with --command)"),
     command: Optional[str] = typer.Option(None, "--command", help="Shell command to execute"),
     max_retries: Optional[int] = typer.Option(None, "--max-retries", help="Max retries (with --command)"),
@@ -118,26 +194,47 @@ def enqueue(
         available_at=available_at,
         metadata=metadata,
     )
-    if job_data is None:
-        job_data = _load_payload(payload, file)
-    elif payload or file:
-        raise typer.BadParameter("Use either --command based options or JSON payload, not both")
-    job = storage.enqueue(job_data)
-    console.print(f"Enqueued job [bold]{job.id}[/bold] -> state={job.state}")
+    if job_data is not None:
+        if payload or file:
+            raise typer.BadParameter("Use either --command based options or JSON payload, not both")
+        try:
+            job = storage.enqueue(job_data)
+        except ValueError as exc:
+            raise typer.BadParameter(str(exc)) from exc
+        console.print(f"Enqueued job [bold]{job.id}[/bold] -> state={job.state}")
+        return
+
+    try:
+        with _load_payload(payload, file) as data:
+            if isinstance(data, dict):
+                job = storage.enqueue(data)
+                console.print(f"Enqueued job [bold]{job.id}[/bold] -> state={job.state}")
+            else:
+                count = storage.enqueue_many(data)
+                console.print(f"Enqueued {count} job(s)")
+    except JSON_ERRORS as exc:
+        raise typer.BadParameter(f"Provided JSON payload is invalid: {exc}") from exc
+    except ValueError as exc:
+        # A job the payload describes is invalid (bad timestamp, duplicate id, ...).
+        raise typer.BadParameter(str(exc)) from exc
+
+
+def _print_page_hint(shown: int, limit: int, offset: int) -> None:
+    if shown == limit:
+        console.print(
+            f"Showing {shown} job(s) from offset {offset}; use --offset {offset + shown} for more"
+        )
 
 
 @app.command("list")
 def list_jobs(
     state: Optional[str] = typer.Option(None, "--state", "-s", help="Filter by job state"),
+    limit: int = typer.Option(DEFAULT_PAGE_SIZE, "--limit", "-n", min=1, help="Maximum number of jobs to show"),
+    offset: int = typer.Option(0, "--offset", min=0, help="Number of jobs to skip"),
 ) -> None:
     """List jobs filtered by state."""
 
     storage = Storage()
-    jobs = storage.list_jobs(state=state)
-    if not jobs:
-        console.print("No jobs found")
-        return
-
     table = Table(show_header=True, header_style="bold")
     table.add_column("ID", overflow="fold")
     table.add_column("State")
@@ -146,7 +243,8 @@ def list_jobs(
     table.add_column("Command", overflow="fold")
     table.add_column("Available At")
     table.add_column("Updated")
-    for job in jobs:
+    # Rows go straight from the cursor into the table; no Job list is kept.
+    for job in storage.iter_jobs(state=state, limit=limit, offset=offset):
         table.add_row(
             job.id,
             job.state,
@@ -156,17 +254,46 @@ def list_jobs(
             job.available_at,
             job.updated_at,
         )
+    if not table.row_count:
+        console.print("No jobs found")
+        return
     console.print(table)
+    _print_page_hint(table.row_count, limit, offset)
 
 
 @app.command()
-def status() -> None:
+def status(
+    since: Optional[str] = typer.Option(
+        None,
+        "--since",
+        help="Only count jobs updated at or after this ISO timestamp",
+    ),
+    as_json: bool = typer.Option(False, "--json", help="Print a machine-readable summary"),
+) -> None:
     """Display queue summary and worker statuses."""
 
     storage = Storage()
-    summary = storage.job_summary()
+    try:
+        summary = storage.job_summary(since=since)
+    except ValueError as exc:
+        raise typer.BadParameter(str(exc), param_hint="--since") from exc
     workers = storage.list_workers()
 
+    if as_json:
+        typer.echo(
+            dump_json(
+                {
+                    "jobs": summary,
+                    # Jobs still waiting to run, including scheduled retries.
+                    "queue_depth": summary["pending"] + summary["failed"],
+                    "processing": summary["processing"],
+                    "workers": workers,
+                },
+                indent=2,
+            )
+        )
+        return
+
     summary_table = Table(show_header=True, header_style="bold")
     summary_table.add_column("State")
     summary_table.add_column("Count")
@@ -202,6 +329,12 @@ def status() -> None:
 def worker_start(
     count: int = typer.Option(1, "--count", "-c", min=1, help="Number of workers to start"),
     foreground: bool = typer.Option(False, "--foreground", help="Run a single worker in the foreground"),
+    inproc: bool = typer.Option(
+        False, "--inproc", help="Run the workers as threads of this process, in the foreground"
+    ),
+    use_async: bool = typer.Option(
+        False, "--async", help="Run each worker's commands as asyncio subprocesses (see `concurrency`)"
+    ),
 ) -> None:
     """Start worker processes to handle background jobs."""
 
@@ -210,25 +343,69 @@ def worker_start(
 
     if foreground and count != 1:
         raise typer.BadParameter("Foreground mode supports only a single worker")
+    if foreground and inproc:
+        raise typer.BadParameter("--foreground and --inproc cannot be combined")
+    _check_affinity()
+
+    if inproc:
+        pool = WorkerPool(count, storage=storage, use_async=use_async)
+        console.print(
+            f"Running {count} in-process worker(s): " + ", ".join(pool.worker_ids)
+        )
+        pool.run()
+        return
 
     if foreground:
-        worker_id = f"worker-{uuid.uuid4().hex[:8]}"
+        worker_id = new_worker_id()
         console.print(f"Starting foreground worker {worker_id}")
-        run_worker(worker_id=worker_id)
+        run_worker(worker_id=worker_id, use_async=use_async)
         return
 
-    worker_ids = []
-    for _ in range(count):
-        worker_id = f"worker-{uuid.uuid4().hex[:8]}"
-        worker_ids.append(worker_id)
-        cmd = [sys.executable, "-m", "queuectl.worker_process", "--worker-id", worker_id]
-        subprocess.Popen(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    # Forked workers must not inherit an open SQLite connection.
+    storage.db.close()
+    if sys.platform == "win32":
+        with ThreadPoolExecutor(max_workers=count) as pool:
+            pids = list(pool.map(lambda _: _spawn_worker(use_async), range(count)))
+    else:
+        pids = [_spawn_worker(use_async, index) for index in range(count)]
 
     console.print(
-        f"Started {count} worker(s): " + ", ".join(worker_ids)
+        f"Started {count} worker(s), pids: " + ", ".join(map(str, pids))
     )
 
 
+@worker_app.command("supervise")
+def worker_supervise(
+    count: Optional[int] = typer.Option(
+        None, "--count", "-c", min=1, help="Number of workers to keep running (default 1)"
+    ),
+    autoscale: bool = typer.Option(
+        False,
+        "--autoscale",
+        help="Scale between the min_workers and max_workers settings by runnable jobs",
+    ),
+) -> None:
+    """Run a foreground supervisor that keeps a pool of forked workers alive."""
+
+    if autoscale and count is not None:
+        raise typer.BadParameter("--autoscale and --count cannot be combined")
+    count = count or 1
+    _check_affinity()
+
+    storage = Storage()
+    storage.clear_stop_requested()
+    supervisor = Supervisor(storage)
+    scaler = Scaler(supervisor) if autoscale else None
+    if scaler is not None:
+        console.print(
+            f"Supervising {scaler.min_workers}-{scaler.max_workers} worker(s); press Ctrl+C to stop"
+        )
+    else:
+        console.print(f"Supervising {count} worker(s); press Ctrl+C to stop")
+    supervisor.run(count, scaler=scaler)
+    console.print("Supervisor stopped")
+
+
 @worker_app.command("stop")
 def worker_stop(
     timeout: int = typer.Option(30, help="Seconds to wait for graceful shutdown"),
@@ -237,16 +414,20 @@ def worker_stop(
 
     storage = Storage()
     storage.set_stop_requested(True)
+    for worker in storage.list_workers():
+        request_stop(worker["pid"])
     console.print("Stop requested. Waiting for workers to exit...")
 
     deadline = time.time() + timeout
+    delay = 0.05
     while time.time() < deadline:
         workers = storage.list_workers()
         if not workers:
             console.print("All workers stopped gracefully")
             storage.clear_stop_requested()
             return
-        time.sleep(1)
+        time.sleep(min(delay, max(deadline - time.time(), 0)))
+        delay = min(delay * 1.5, 1.0)
 
     workers = storage.list_workers()
     if not workers:
@@ -256,30 +437,27 @@ def worker_stop(
 
     console.print("Timeout reached. Forcing remaining workers to exit...")
     for worker in workers:
-        pid = worker["pid"]
-        terminate_process(pid)
-        storage.remove_worker(worker["worker_id"])
+        terminate_process(worker["pid"])
+    storage.remove_workers(worker["worker_id"] for worker in workers)
     storage.clear_stop_requested()
     console.print("Forced termination issued to remaining workers")
 
 
 @dlq_app.command("list")
-def dlq_list() -> None:
+def dlq_list(
+    limit: int = typer.Option(DEFAULT_PAGE_SIZE, "--limit", "-n", min=1, help="Maximum number of jobs to show"),
+    offset: int = typer.Option(0, "--offset", min=0, help="Number of jobs to skip"),
+) -> None:
     """List jobs currently in the dead letter queue."""
 
     storage = Storage()
-    jobs = storage.list_dead_jobs()
-    if not jobs:
-        console.print("Dead letter queue is empty")
-        return
-
     table = Table(show_header=True, header_style="bold")
     table.add_column("ID", overflow="fold")
     table.add_column("Attempts")
     table.add_column("Command", overflow="fold")
     table.add_column("Last Error", overflow="fold")
     table.add_column("Updated")
-    for job in jobs:
+    for job in storage.iter_jobs(state="dead", limit=limit, offset=offset):
         table.add_row(
             job.id,
             str(job.attempts),
@@ -287,7 +465,11 @@ def dlq_list() -> None:
             (job.last_error or "")[:120],
             job.updated_at,
         )
+    if not table.row_count:
+        console.print("Dead letter queue is empty")
+        return
     console.print(table)
+    _print_page_hint(table.row_count, limit, offset)
 
 
 @dlq_app.command("retry")
@@ -1,11 +1,13 @@
 from __future__ import annotations
 
+import atexit
+import os
 import sqlite3
 from pathlib import Path
-from threading import Lock
-from typing import Callable, Optional, TypeVar
+from threading import Lock, local
+from typing import Callable, Dict, Optional, TypeVar
 
-from .utils import to_iso, utcnow
+from .utils import normalize_iso
 
 
 SCHEMA = """
@@ -27,6 +29,11 @@ CREATE TABLE IF NOT EXISTS jobs (
     metadata TEXT
 );
 
+CREATE INDEX IF NOT EXISTS idx_jobs_acquire
+    ON jobs(state, priority DESC, available_at ASC, created_at ASC);
+
+CREATE INDEX IF NOT EXISTS idx_jobs_updated ON jobs(updated_at DESC);
+
 CREATE TABLE IF NOT EXISTS config (
     key TEXT PRIMARY KEY,
     value TEXT NOT NULL
@@ -52,19 +59,39 @@ DEFAULT_CONFIG = {
     "max_retries": "3",
     "backoff_base": "2",
     "poll_interval": "2",
+    "max_poll_interval": "2",
+    "concurrency": "1",
+    "min_workers": "1",
+    "max_workers": "4",
+    "scale_up_threshold": "10",
+    "idle_ttl": "30",
+    "group_commit_interval": "0",
+    "group_commit_max": "64",
     "heartbeat_interval": "5",
     "command_timeout": "0",
 }
 
 
+# Stored in PRAGMA user_version once _migrate() has brought a database up to date.
+SCHEMA_VERSION = 1
+
+# available_at exactly as to_iso() writes it.
+_ISO_GLOB = "[0-9][0-9][0-9][0-9]-[0-9][0-9]-[0-9][0-9]T[0-9][0-9]:[0-9][0-9]:[0-9][0-9].[0-9][0-9][0-9][0-9][0-9][0-9]Z"
+
 T = TypeVar("T")
 
 
 class Database:
     def __init__(self, db_path: Path):
         self.db_path = db_path
+        # Sentinel mirroring worker_control.stop_requested for cheap polling.
+        self.stop_path = db_path.with_name(db_path.stem + ".stop")
+        # Its mtime is bumped whenever jobs become runnable; idle workers stat it.
+        self.wake_path = db_path.with_name(db_path.stem + ".wake")
         self._lock = Lock()
         self._initialized = False
+        self._tls = local()
+        self._connections: list[sqlite3.Connection] = []
 
     def init(self) -> None:
         with self._lock:
@@ -74,36 +101,92 @@ class Database:
             try:
                 conn.executescript(SCHEMA)
                 self._ensure_defaults(conn)
+                self._migrate(conn)
                 conn.commit()
             finally:
                 conn.close()
             self._initialized = True
 
-    def _connect(self) -> sqlite3.Connection:
-        conn = sqlite3.connect(self.db_path, detect_types=sqlite3.PARSE_DECLTYPES)
+    def close(self) -> None:
+        with self._lock:
+            connections, self._connections = self._connections, []
+        self._tls.__dict__.clear()
+        remaining = []
+        for conn in connections:
+            try:
+                conn.close()
+            except sqlite3.ProgrammingError:
+                # Owned by another thread, which keeps using it.
+                remaining.append(conn)
+        with self._lock:
+            self._connections.extend(remaining)
+
+    def _connect(self, *, readonly: bool = False) -> sqlite3.Connection:
+        conn = sqlite3.connect(
+            self.db_path,
+            detect_types=sqlite3.PARSE_DECLTYPES,
+            cached_statements=256,
+        )
         conn.row_factory = sqlite3.Row
         conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("PRAGMA busy_timeout=5000")
+        conn.execute("PRAGMA wal_autocheckpoint=1000")
+        conn.execute("PRAGMA mmap_size=268435456")
+        conn.execute("PRAGMA temp_store=MEMORY")
         conn.execute("PRAGMA foreign_keys=ON")
+        conn.execute("PRAGMA cache_size=-8000")
+        if readonly:
+            # Reader connections can never take the write lock.
+            conn.execute("PRAGMA query_only=1")
         return conn
 
     def connection(self) -> sqlite3.Connection:
-        self.init()
-        return self._connect()
+        return self._thread_connection("writer")
+
+    def reader(self) -> sqlite3.Connection:
+        # Separate from the writer so polling reads never queue behind (or
+        # hold a snapshot inside) a write transaction.
+        return self._thread_connection("reader", readonly=True)
+
+    def _thread_connection(self, slot: str, *, readonly: bool = False) -> sqlite3.Connection:
+        if not self._initialized:
+            self.init()
+        pid = os.getpid()
+        cached = getattr(self._tls, slot, None)
+        # One connection per thread and role, reopened in forked children.
+        if cached is not None and cached[0] == pid:
+            return cached[1]
+        conn = self._connect(readonly=readonly)
+        setattr(self._tls, slot, (pid, conn))
+        with self._lock:
+            self._connections.append(conn)
+        return conn
+
+    def cursor(self, conn: sqlite3.Connection) -> sqlite3.Cursor:
+        # One reused cursor per thread for hot statements, saving an allocation
+        # per execute(); consume its result before the next call.
+        cached = getattr(self._tls, "cursor", None)
+        if cached is None or cached[0] is not conn:
+            cached = (conn, conn.cursor())
+            self._tls.cursor = cached
+        return cached[1]
 
     def transaction(self, func: Callable[[sqlite3.Connection], "T"]) -> "T":
         conn = self.connection()
+        with conn:
+            return func(conn)
+
+    def read(self, func: Callable[[sqlite3.Connection], "T"]) -> "T":
+        # SELECTs never open an implicit transaction, so there is nothing to commit.
+        conn = self.reader()
         try:
-            result = func(conn)
-            conn.commit()
-            return result
+            return func(conn)
         except Exception:
             conn.rollback()
             raise
-        finally:
-            conn.close()
 
     def _ensure_defaults(self, conn: sqlite3.Connection) -> None:
-        now = to_iso(utcnow())
         for key, value in DEFAULT_CONFIG.items():
             conn.execute(
                 "INSERT OR IGNORE INTO config(key, value) VALUES(?, ?)",
@@ -114,11 +197,38 @@ class Database:
             ("stop_requested", "0"),
         )
 
+    def _migrate(self, conn: sqlite3.Connection) -> None:
+        if conn.execute("PRAGMA user_version").fetchone()[0] >= SCHEMA_VERSION:
+            return
+        # Jobs enqueued before available_at was normalized may hold other ISO
+        # forms, which the acquire query's text comparison would misorder.
+        rows = conn.execute(
+            "SELECT id, available_at FROM jobs WHERE available_at NOT GLOB ?", (_ISO_GLOB,)
+        ).fetchall()
+        for row in rows:
+            try:
+                value = normalize_iso(row["available_at"])
+            except ValueError:
+                continue
+            conn.execute("UPDATE jobs SET available_at = ? WHERE id = ?", (value, row["id"]))
+        conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+
+
+# One Database per file, shared by every Storage in the process.
+_databases: Dict[Path, Database] = {}
+_databases_lock = Lock()
+
 
 def get_database(db_path: Optional[Path] = None) -> Database:
     if db_path is None:
         db_path = Path("queuectl.db")
-    db = Database(db_path)
+    # Resolved now, so a later chdir cannot point it at another file.
+    db_path = db_path.resolve()
+    with _databases_lock:
+        db = _databases.get(db_path)
+        if db is None:
+            db = _databases[db_path] = Database(db_path)
+            atexit.register(db.close)
     db.init()
     return db
 
@@ -1,17 +1,78 @@
 from __future__ import annotations
 
-import json
+import atexit
+import os
+import secrets
 import sqlite3
-import uuid
-from dataclasses import dataclass
+import threading
+import time
+from dataclasses import dataclass, fields
 from datetime import datetime, timedelta
-from typing import Dict, Iterable, List, Optional
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
 
 from .db import Database, DEFAULT_CONFIG, get_database
-from .utils import dump_json, to_iso, utcnow
-
-
-@dataclass
+from .utils import dump_json, normalize_iso, to_iso, utcnow
+
+
+CONFIG_CACHE_TTL = 5.0
+
+_INSERT_JOB_SQL = """
+    INSERT INTO jobs (
+        id, command, state, attempts, max_retries, priority,
+        created_at, updated_at, available_at, metadata
+    ) VALUES (?, ?, 'pending', 0, ?, ?, ?, ?, ?, ?)
+"""
+
+_ACQUIRE_JOBS_SQL = """
+    UPDATE jobs
+    SET state = 'processing', attempts = attempts + 1,
+        started_at = :now, updated_at = :now
+    WHERE id IN (
+        SELECT id FROM jobs
+        WHERE state IN ('pending', 'failed')
+          AND available_at <= :now
+        ORDER BY priority DESC, available_at ASC, created_at ASC
+        LIMIT :limit
+    )
+    RETURNING *
+"""
+
+_RELEASE_JOBS_SQL = """
+    UPDATE jobs
+    SET state = CASE WHEN attempts > 1 THEN 'failed' ELSE 'pending' END,
+        attempts = attempts - 1, started_at = NULL, updated_at = ?
+    WHERE id = ? AND state = 'processing'
+"""
+
+_COMPLETE_JOB_SQL = """
+    UPDATE jobs
+    SET state = 'completed', updated_at = ?, completed_at = ?,
+        last_error = NULL, last_exit_code = 0, output = ?
+    WHERE id = ?
+"""
+
+_DEAD_JOB_SQL = """
+    UPDATE jobs
+    SET state = 'dead', updated_at = ?, last_error = ?,
+        last_exit_code = ?, available_at = ?, output = NULL
+    WHERE id = ?
+"""
+
+_RETRY_JOB_SQL = """
+    UPDATE jobs
+    SET state = 'failed', updated_at = ?, available_at = ?,
+        last_error = ?, last_exit_code = ?, output = NULL
+    WHERE id = ?
+"""
+
+_WORKER_STATE_SQL = """
+    UPDATE worker_heartbeats
+    SET state = ?, last_heartbeat = ?, details = ?
+    WHERE worker_id = ?
+"""
+
+
+@dataclass(slots=True)
 class Job:
     id: str
     command: str
@@ -30,136 +91,304 @@ class Job:
     metadata: Optional[str] = None
 
 
+# Column list in Job field order, so plain tuples can be passed as Job(*row).
+_JOB_COLUMNS = ", ".join(field.name for field in fields(Job))
+
+
+def _insert_params(job: Job) -> tuple:
+    return (
+        job.id,
+        job.command,
+        job.max_retries,
+        job.priority,
+        job.created_at,
+        job.updated_at,
+        job.available_at,
+        job.metadata,
+    )
+
+
+class _Flusher:
+    # Background thread that commits job results in small batches: the first
+    # result opens a short window, and everything queued by then (up to
+    # max_batch) shares one transaction.
+
+    def __init__(self, db: Database, interval: float, max_batch: int):
+        self.db = db
+        self.interval = interval
+        self.max_batch = max_batch
+        self.pid = os.getpid()
+        self._pending: List[Tuple[str, tuple]] = []
+        # Results from batches that failed to commit, rewritten by the caller.
+        self._failed: List[Tuple[str, tuple]] = []
+        self._cond = threading.Condition()
+        # Held while writing so flush() returns only after in-flight batches land.
+        self._write_lock = threading.Lock()
+        threading.Thread(target=self._run, name="queuectl-flusher", daemon=True).start()
+
+    def submit(self, sql: str, params: tuple) -> None:
+        self._write_failed()
+        with self._cond:
+            self._pending.append((sql, params))
+            if len(self._pending) in (1, self.max_batch):
+                self._cond.notify()
+
+    def flush(self) -> None:
+        with self._write_lock:
+            self._commit(self._take_pending())
+        self._write_failed()
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                while not self._pending:
+                    self._cond.wait()
+                if len(self._pending) < self.max_batch:
+                    self._cond.wait(self.interval)
+            with self._write_lock:
+                self._commit(self._take_pending())
+
+    def _take_pending(self) -> List[Tuple[str, tuple]]:
+        with self._cond:
+            batch, self._pending = self._pending, []
+        return batch
+
+    def _commit(self, batch: List[Tuple[str, tuple]]) -> None:
+        try:
+            self._write(batch)
+        except Exception:
+            # Nothing in the batch landed. Keep it for _write_failed() rather
+            # than leaving its jobs in 'processing' for good.
+            with self._cond:
+                self._failed.extend(batch)
+
+    def _write_failed(self) -> None:
+        # Runs in the thread recording results: each failed result is retried
+        # in its own transaction, and an error that persists is raised to
+        # the worker now, as it would be without group commit.
+        if not self._failed:
+            return
+        with self._cond:
+            failed, self._failed = self._failed, []
+        error: Optional[Exception] = None
+        for item in failed:
+            try:
+                self._write([item])
+            except Exception as exc:
+                error = error or exc
+        if error is not None:
+            raise error
+
+    def _write(self, batch: List[Tuple[str, tuple]]) -> None:
+        if not batch:
+            return
+
+        def _apply(conn):
+            cur = self.db.cursor(conn)
+            for sql, params in batch:
+                cur.execute(sql, params)
+
+        self.db.transaction(_apply)
+
+
 class Storage:
     def __init__(self, db: Optional[Database] = None):
         self.db = db or get_database()
+        self._config_cache: Dict[str, Tuple[float, str]] = {}
+        # (interval, max batch) for grouping job results; read on first use.
+        self._group_commit: Optional[Tuple[float, int]] = None
+        self._flusher: Optional[_Flusher] = None
+        # WorkerPool threads share one Storage; only one of them may start the flusher.
+        self._flusher_lock = threading.Lock()
 
     # Job operations -----------------------------------------------------
-    def enqueue(self, payload: Dict) -> Job:
-        now = utcnow()
-        job_id = payload.get("id") or uuid.uuid4().hex
+    def _new_job(self, payload: Dict, now_iso: str) -> Job:
+        job_id = payload.get("id") or secrets.token_hex(16)
         command = payload.get("command")
         if not command:
             raise ValueError("Job payload must include a 'command'")
 
         max_retries = int(payload.get("max_retries") or self.get_config("max_retries"))
         priority = int(payload.get("priority", 0))
-        available_at_iso = payload.get("available_at") or to_iso(now)
+        available_at = payload.get("available_at")
         metadata = payload.get("metadata")
+        return Job(
+            id=job_id,
+            command=command,
+            state="pending",
+            attempts=0,
+            max_retries=max_retries,
+            created_at=now_iso,
+            updated_at=now_iso,
+            available_at=normalize_iso(available_at) if available_at else now_iso,
+            priority=priority,
+            metadata=metadata if metadata is None or isinstance(metadata, str) else dump_json(metadata),
+        )
+
+    def enqueue(self, payload: Dict) -> Job:
+        job = self._new_job(payload, to_iso(utcnow()))
 
         def _insert(conn):
-            conn.execute(
-                """
-                INSERT INTO jobs (
-                    id, command, state, attempts, max_retries, priority,
-                    created_at, updated_at, available_at, metadata
-                ) VALUES (?, ?, 'pending', 0, ?, ?, ?, ?, ?, ?)
-                """,
-                (
-                    job_id,
-                    command,
-                    max_retries,
-                    priority,
-                    to_iso(now),
-                    to_iso(now),
-                    available_at_iso,
-                    metadata if metadata is None or isinstance(metadata, str) else json.dumps(metadata),
-                ),
-            )
+            conn.execute(_INSERT_JOB_SQL, _insert_params(job))
 
         try:
             self.db.transaction(_insert)
         except sqlite3.IntegrityError as exc:
-            raise ValueError(f"Job with id {job_id} already exists") from exc
-        job = self.get_job(job_id)
-        assert job is not None
+            raise ValueError(f"Job with id {job.id} already exists") from exc
+        self._notify_enqueue()
         return job
 
+    def enqueue_many(self, payloads: Iterable[Dict]) -> int:
+        # Rows are built as executemany() pulls them, so a streamed import
+        # holds one payload at a time; returns how many jobs were enqueued.
+        now_iso = to_iso(utcnow())
+        count = 0
+
+        def _params():
+            nonlocal count
+            for payload in payloads:
+                yield _insert_params(self._new_job(payload, now_iso))
+                count += 1
+
+        def _insert_many(conn):
+            conn.executemany(_INSERT_JOB_SQL, _params())
+
+        try:
+            self.db.transaction(_insert_many)
+        except sqlite3.IntegrityError as exc:
+            raise ValueError("One or more job ids already exist; no jobs were enqueued") from exc
+        if count:
+            self._notify_enqueue()
+        return count
+
+    def enqueue_stamp(self) -> int:
+        # Changes whenever jobs become runnable, from whichever process.
+        try:
+            return os.stat(self.db.wake_path).st_mtime_ns
+        except FileNotFoundError:
+            return 0
+
+    def _notify_enqueue(self) -> None:
+        # An explicit nanosecond stamp, since the filesystem's own clock may
+        # be too coarse to tell back-to-back enqueues apart.
+        stamp = time.time_ns()
+        try:
+            os.utime(self.db.wake_path, ns=(stamp, stamp))
+        except FileNotFoundError:
+            self.db.wake_path.touch()
+
     def get_job(self, job_id: str) -> Optional[Job]:
         def _fetch(conn):
             row = conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
             return Job(**row) if row else None
 
-        return self.db.transaction(_fetch)
+        return self.db.read(_fetch)
 
-    def list_jobs(self, state: Optional[str] = None) -> List[Job]:
-        def _list(conn):
+    def iter_jobs(
+        self,
+        state: Optional[str] = None,
+        *,
+        limit: Optional[int] = None,
+        offset: int = 0,
+    ) -> Iterator[Job]:
+        # SQLite treats a negative LIMIT as "no limit".
+        page = (-1 if limit is None else limit, offset)
+
+        def _query(conn):
+            cur = conn.cursor()
+            cur.row_factory = None
             if state:
-                rows = conn.execute(
-                    "SELECT * FROM jobs WHERE state = ? ORDER BY updated_at DESC",
-                    (state,),
-                ).fetchall()
+                cur.execute(
+                    f"SELECT {_JOB_COLUMNS} FROM jobs WHERE state = ? "
+                    "ORDER BY updated_at DESC LIMIT ? OFFSET ?",
+                    (state, *page),
+                )
             else:
-                rows = conn.execute(
-                    "SELECT * FROM jobs ORDER BY updated_at DESC",
-                ).fetchall()
-            return [Job(**row) for row in rows]
+                cur.execute(
+                    f"SELECT {_JOB_COLUMNS} FROM jobs ORDER BY updated_at DESC LIMIT ? OFFSET ?",
+                    page,
+                )
+            return cur
+
+        for row in self.db.read(_query):
+            yield Job(*row)
+
+    def list_jobs(
+        self,
+        state: Optional[str] = None,
+        *,
+        limit: Optional[int] = None,
+        offset: int = 0,
+    ) -> List[Job]:
+        return list(self.iter_jobs(state, limit=limit, offset=offset))
 
-        return self.db.transaction(_list)
+    def list_dead_jobs(self, *, limit: Optional[int] = None, offset: int = 0) -> List[Job]:
+        return self.list_jobs(state="dead", limit=limit, offset=offset)
 
-    def list_dead_jobs(self) -> List[Job]:
-        return self.list_jobs(state="dead")
+    def runnable_count(self) -> int:
+        # Jobs a worker could claim right now (unlike `status --json`'s
+        # queue_depth, scheduled retries are excluded); served by idx_jobs_acquire.
+        now_iso = to_iso(utcnow())
+
+        def _count(conn):
+            return conn.execute(
+                "SELECT COUNT(*) FROM jobs WHERE state IN ('pending', 'failed') AND available_at <= ?",
+                (now_iso,),
+            ).fetchone()[0]
 
-    def job_summary(self) -> Dict[str, int]:
+        return self.db.read(_count)
+
+    def job_summary(self, since: Optional[str] = None) -> Dict[str, int]:
         def _summary(conn):
-            rows = conn.execute(
-                "SELECT state, COUNT(*) as count FROM jobs GROUP BY state"
-            ).fetchall()
+            if since:
+                rows = conn.execute(
+                    "SELECT state, COUNT(*) as count FROM jobs WHERE updated_at >= ? GROUP BY state",
+                    (normalize_iso(since),),
+                ).fetchall()
+            else:
+                rows = conn.execute(
+                    "SELECT state, COUNT(*) as count FROM jobs GROUP BY state"
+                ).fetchall()
             summary = {row["state"]: row["count"] for row in rows}
             for state in ["pending", "processing", "completed", "failed", "dead"]:
                 summary.setdefault(state, 0)
             return summary
 
-        return self.db.transaction(_summary)
+        return self.db.read(_summary)
 
     def acquire_job(self) -> Optional[Job]:
+        jobs = self.acquire_jobs(1)
+        return jobs[0] if jobs else None
+
+    def acquire_jobs(self, limit: int) -> List[Job]:
         now_iso = to_iso(utcnow())
 
         def _acquire(conn):
-            row = conn.execute(
-                """
-                SELECT id FROM jobs
-                WHERE state IN ('pending', 'failed')
-                  AND datetime(available_at) <= datetime(?)
-                ORDER BY priority DESC, available_at ASC, created_at ASC
-                LIMIT 1
-                """,
-                (now_iso,),
-            ).fetchone()
-            if row is None:
-                return None
-            job_id = row["id"]
-            updated = conn.execute(
-                """
-                UPDATE jobs
-                SET state = 'processing', attempts = attempts + 1,
-                    started_at = ?, updated_at = ?
-                WHERE id = ? AND state IN ('pending', 'failed')
-                """,
-                (now_iso, now_iso, job_id),
-            )
-            if updated.rowcount == 0:
-                return None
-            job_row = conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
-            return Job(**job_row)
+            cur = self.db.cursor(conn)
+            rows = cur.execute(_ACQUIRE_JOBS_SQL, {"now": now_iso, "limit": limit}).fetchall()
+            return [Job(**row) for row in rows]
 
-        return self.db.transaction(_acquire)
+        jobs = self.db.transaction(_acquire)
+        # RETURNING does not preserve the subquery's ORDER BY.
+        jobs.sort(key=lambda job: (-job.priority, job.available_at, job.created_at))
+        return jobs
 
-    def mark_completed(self, job_id: str, output: str) -> None:
-        completed_at = to_iso(utcnow())
+    def release_jobs(self, jobs: Iterable[Job]) -> None:
+        # Undo the claim on jobs that were acquired but never started.
+        now_iso = to_iso(utcnow())
+        params = [(now_iso, job.id) for job in jobs]
+        if not params:
+            return
 
-        def _complete(conn):
-            conn.execute(
-                """
-                UPDATE jobs
-                SET state = 'completed', updated_at = ?, completed_at = ?,
-                    last_error = NULL, last_exit_code = 0, output = ?
-                WHERE id = ?
-                """,
-                (completed_at, completed_at, output, job_id),
-            )
+        def _release(conn):
+            conn.executemany(_RELEASE_JOBS_SQL, params)
+
+        self.db.transaction(_release)
+        self._notify_enqueue()
 
-        self.db.transaction(_complete)
+    def mark_completed(self, job_id: str, output: str) -> None:
+        completed_at = to_iso(utcnow())
+        self._record(_COMPLETE_JOB_SQL, (completed_at, completed_at, output, job_id))
 
     def mark_failed(
         self,
@@ -174,40 +403,79 @@ class Storage:
         next_delay = backoff_base ** attempts
         next_available = to_iso(now + timedelta(seconds=next_delay))
         updated = to_iso(now)
-
-        def _update(conn):
-            if attempts >= job.max_retries:
-                conn.execute(
-                    """
-                    UPDATE jobs
-                    SET state = 'dead', updated_at = ?, last_error = ?,
-                        last_exit_code = ?, available_at = ?, output = NULL
-                    WHERE id = ?
-                    """,
-                    (updated, error, exit_code, next_available, job.id),
-                )
-            else:
-                conn.execute(
-                    """
-                    UPDATE jobs
-                    SET state = 'failed', updated_at = ?, available_at = ?,
-                        last_error = ?, last_exit_code = ?, output = NULL
-                    WHERE id = ?
-                    """,
-                    (updated, next_available, error, exit_code, job.id),
+        if attempts >= job.max_retries:
+            self._record(_DEAD_JOB_SQL, (updated, error, exit_code, next_available, job.id))
+        else:
+            self._record(_RETRY_JOB_SQL, (updated, next_available, error, exit_code, job.id))
+
+    def flush(self) -> None:
+        # Commit any job results still waiting for the group-commit window.
+        if self._flusher is not None and self._flusher.pid == os.getpid():
+            self._flusher.flush()
+
+    def _record(self, sql: str, params: tuple) -> None:
+        flusher = self._get_flusher()
+        if flusher is not None:
+            flusher.submit(sql, params)
+            return
+
+        def _write(conn):
+            self.db.cursor(conn).execute(sql, params)
+
+        self.db.transaction(_write)
+
+    def _get_flusher(self) -> Optional["_Flusher"]:
+        flusher = self._flusher
+        if flusher is not None and flusher.pid == os.getpid():
+            return flusher
+        with self._flusher_lock:
+            # Re-checked: another thread may have started it while we waited.
+            if self._flusher is not None and self._flusher.pid == os.getpid():
+                return self._flusher
+            if self._group_commit is None:
+                values = self.get_configs(["group_commit_interval", "group_commit_max"])
+                self._group_commit = (
+                    float(values["group_commit_interval"]),
+                    max(int(values["group_commit_max"]), 1),
                 )
-
-        self.db.transaction(_update)
+            interval, max_batch = self._group_commit
+            if interval <= 0:
+                return None
+            # Started lazily, and again in a forked child, which loses threads.
+            self._flusher = _Flusher(self.db, interval, max_batch)
+            atexit.register(self._flusher.flush)
+            return self._flusher
 
     # Config -------------------------------------------------------------
     def get_config(self, key: str) -> str:
+        return self.get_configs([key])[key]
+
+    def get_configs(self, keys: Iterable[str]) -> Dict[str, str]:
+        now = time.monotonic()
+        values: Dict[str, str] = {}
+        missing: List[str] = []
+        for key in keys:
+            cached = self._config_cache.get(key)
+            if cached and now - cached[0] < CONFIG_CACHE_TTL:
+                values[key] = cached[1]
+            else:
+                missing.append(key)
+        if not missing:
+            return values
+
         def _get(conn):
-            row = conn.execute("SELECT value FROM config WHERE key = ?", (key,)).fetchone()
-            if row:
-                return row["value"]
-            return DEFAULT_CONFIG[key]
+            placeholders = ",".join("?" * len(missing))
+            rows = conn.execute(
+                f"SELECT key, value FROM config WHERE key IN ({placeholders})", missing
+            ).fetchall()
+            return {row["key"]: row["value"] for row in rows}
 
-        return self.db.transaction(_get)
+        found = self.db.read(_get)
+        for key in missing:
+            value = found[key] if key in found else DEFAULT_CONFIG[key]
+            self._config_cache[key] = (now, value)
+            values[key] = value
+        return values
 
     def set_config(self, key: str, value: str) -> None:
         def _set(conn):
@@ -217,6 +485,7 @@ class Storage:
             )
 
         self.db.transaction(_set)
+        self._config_cache.pop(key, None)
 
     def list_config(self) -> Dict[str, str]:
         def _list(conn):
@@ -226,24 +495,25 @@ class Storage:
                 cfg.setdefault(key, default)
             return cfg
 
-        return self.db.transaction(_list)
+        return self.db.read(_list)
 
     # Worker coordination -----------------------------------------------
-    def register_worker(self, worker_id: str, pid: int) -> None:
+    def register_worker(self, worker_id: str, pid: int, initial_state: str = "idle") -> None:
         now_iso = to_iso(utcnow())
 
         def _register(conn):
             conn.execute(
                 """
                 INSERT INTO worker_heartbeats(worker_id, pid, state, started_at, last_heartbeat)
-                VALUES(?, ?, 'running', ?, ?)
+                VALUES(?, ?, ?, ?, ?)
                 ON CONFLICT(worker_id) DO UPDATE SET
                     pid = excluded.pid,
-                    state = 'running',
+                    state = excluded.state,
                     started_at = excluded.started_at,
-                    last_heartbeat = excluded.last_heartbeat
+                    last_heartbeat = excluded.last_heartbeat,
+                    details = NULL
                 """,
-                (worker_id, pid, now_iso, now_iso),
+                (worker_id, pid, initial_state, now_iso, now_iso),
             )
 
         self.db.transaction(_register)
@@ -252,14 +522,7 @@ class Storage:
         now_iso = to_iso(utcnow())
 
         def _update(conn):
-            conn.execute(
-                """
-                UPDATE worker_heartbeats
-                SET state = ?, last_heartbeat = ?, details = ?
-                WHERE worker_id = ?
-                """,
-                (state, now_iso, details, worker_id),
-            )
+            self.db.cursor(conn).execute(_WORKER_STATE_SQL, (state, now_iso, details, worker_id))
 
         self.db.transaction(_update)
 
@@ -269,6 +532,17 @@ class Storage:
 
         self.db.transaction(_remove)
 
+    def remove_workers(self, worker_ids: Iterable[str]) -> None:
+        ids = list(worker_ids)
+        if not ids:
+            return
+
+        def _remove(conn):
+            placeholders = ", ".join("?" * len(ids))
+            conn.execute(f"DELETE FROM worker_heartbeats WHERE worker_id IN ({placeholders})", ids)
+
+        self.db.transaction(_remove)
+
     def list_workers(self) -> List[dict]:
         def _list(conn):
             rows = conn.execute(
@@ -276,7 +550,7 @@ class Storage:
             ).fetchall()
             return [dict(row) for row in rows]
 
-        return self.db.transaction(_list)
+        return self.db.read(_list)
 
     def set_stop_requested(self, requested: bool) -> None:
         value = "1" if requested else "0"
@@ -287,20 +561,18 @@ class Storage:
                 ("stop_requested", value),
             )
 
+        if not requested:
+            self.db.stop_path.unlink(missing_ok=True)
         self.db.transaction(_set)
+        if requested:
+            self.db.stop_path.touch()
 
     def clear_stop_requested(self) -> None:
         self.set_stop_requested(False)
 
     def stop_requested(self) -> bool:
-        def _get(conn):
-            row = conn.execute(
-                "SELECT value FROM worker_control WHERE key = ?",
-                ("stop_requested",),
-            ).fetchone()
-            return row and row["value"] == "1"
-
-        return self.db.transaction(_get)
+        # A single stat() instead of a query; set_stop_requested keeps both in sync.
+        return self.db.stop_path.exists()
 
     def retry_dead_job(self, job_id: str) -> Job:
         now_iso = to_iso(utcnow())
@@ -329,7 +601,9 @@ class Storage:
             refreshed = conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
             return Job(**refreshed)
 
-        return self.db.transaction(_retry)
+        job = self.db.transaction(_retry)
+        self._notify_enqueue()
+        return job
 
 
 __all__ = ["Job", "Storage"]
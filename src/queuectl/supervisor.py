@@ -0,0 +1,171 @@
+from __future__ import annotations
+
+import itertools
+import multiprocessing
+import os
+import signal
+import sys
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, List, Optional
+
+from .storage import Storage
+from .worker import WorkerRunner, new_worker_id
+
+
+SUPERVISE_INTERVAL = 1.0
+
+
+def _context() -> Any:
+    # fork shares the already-imported queuectl modules copy-on-write.
+    return multiprocessing.get_context("spawn" if sys.platform == "win32" else "fork")
+
+
+def _worker_main(worker_id: str, gate: Any, index: int) -> None:
+    # Ctrl+C reaches the whole process group; the supervisor stops children itself.
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    WorkerRunner(storage=Storage(), worker_id=worker_id, gate=gate, index=index).run()
+
+
+@dataclass
+class _PooledWorker:
+    worker_id: str
+    process: Any
+    gate: Any
+    index: int
+
+
+class Supervisor:
+    def __init__(self, storage: Optional[Storage] = None):
+        self.storage = storage or Storage()
+        self._ctx = _context()
+        self._workers: List[_PooledWorker] = []
+        self._should_stop = False
+        # Registered alongside the workers so `worker stop` signals it too.
+        self.worker_id = f"supervisor-{os.getpid()}"
+
+    @property
+    def active_count(self) -> int:
+        return sum(1 for worker in self._workers if worker.gate.is_set())
+
+    def scale_workers(self, target: int) -> None:
+        target = max(target, 0)
+        self._reap()
+        if self._should_stop:
+            return
+        # Wake parked workers before forking new ones.
+        for worker in self._workers:
+            if self.active_count >= target:
+                break
+            worker.gate.set()
+        while self.active_count < target:
+            self._spawn()
+        for worker in reversed(self._workers):
+            if self.active_count <= target:
+                break
+            worker.gate.clear()
+
+    def run(self, count: int, *, scaler: Optional[Scaler] = None) -> None:
+        previous = {}
+        if threading.current_thread() is threading.main_thread():
+            for signum in (signal.SIGINT, signal.SIGTERM):
+                previous[signum] = signal.signal(signum, self._handle_signal)
+        self.storage.register_worker(self.worker_id, os.getpid(), initial_state="supervising")
+        try:
+            if scaler is not None:
+                scaler.start()
+            while not self._should_stop and not self.storage.stop_requested():
+                # Also replaces workers that exited unexpectedly.
+                self.scale_workers(scaler.target() if scaler is not None else count)
+                time.sleep(SUPERVISE_INTERVAL)
+        finally:
+            for signum, handler in previous.items():
+                signal.signal(signum, handler)
+            self.shutdown()
+            self.storage.remove_worker(self.worker_id)
+
+    def shutdown(self, timeout: float = 30.0) -> None:
+        for worker in self._workers:
+            # Parked workers must wake up to notice the signal.
+            worker.gate.set()
+            if worker.process.is_alive():
+                worker.process.terminate()
+        deadline = time.monotonic() + timeout
+        for worker in self._workers:
+            worker.process.join(max(deadline - time.monotonic(), 0))
+            if worker.process.is_alive():
+                worker.process.kill()
+                worker.process.join()
+        self.storage.remove_workers(worker.worker_id for worker in self._workers)
+        self._workers.clear()
+
+    def _spawn(self) -> None:
+        worker_id = new_worker_id()
+        gate = self._ctx.Event()
+        gate.set()
+        # A replacement takes over the lowest free index, and so its CPU.
+        used = {worker.index for worker in self._workers}
+        index = next(i for i in itertools.count() if i not in used)
+        # Forked children must not inherit an open SQLite connection.
+        self.storage.db.close()
+        process = self._ctx.Process(
+            target=_worker_main, args=(worker_id, gate, index), name=worker_id
+        )
+        process.start()
+        self._workers.append(_PooledWorker(worker_id, process, gate, index))
+
+    def _reap(self) -> None:
+        alive = []
+        for worker in self._workers:
+            # is_alive() also reaps exited children.
+            if worker.process.is_alive():
+                alive.append(worker)
+            elif worker.process.exitcode == 0:
+                # Workers only exit cleanly on a stop request (SIGTERM or the
+                # stop flag); replacing them would undo `worker stop`.
+                self._should_stop = True
+        self._workers = alive
+
+    def _handle_signal(self, signum, frame) -> None:
+        self._should_stop = True
+
+
+class Scaler:
+    def __init__(self, supervisor: Supervisor):
+        self.supervisor = supervisor
+        values = supervisor.storage.get_configs(
+            ["min_workers", "max_workers", "scale_up_threshold", "idle_ttl"]
+        )
+        self.min_workers = max(int(values["min_workers"]), 0)
+        self.max_workers = max(int(values["max_workers"]), self.min_workers)
+        self.scale_up_threshold = max(int(values["scale_up_threshold"]), 1)
+        self.idle_ttl = float(values["idle_ttl"])
+        self._idle_since: Optional[float] = None
+
+    def start(self) -> None:
+        # Fork the whole pool up front and park the surplus, so scaling up
+        # later only sets an Event.
+        self.supervisor.scale_workers(self.max_workers)
+        self.supervisor.scale_workers(self.min_workers)
+
+    def target(self) -> int:
+        active = self.supervisor.active_count
+        runnable = self.supervisor.storage.runnable_count()
+        if runnable > self.scale_up_threshold * max(active, 1):
+            self._idle_since = None
+            return min(active + 1, self.max_workers)
+        if runnable:
+            self._idle_since = None
+            return max(active, self.min_workers)
+        # Park one worker per idle_ttl while the queue stays empty.
+        now = time.monotonic()
+        if self._idle_since is None:
+            self._idle_since = now
+        elif now - self._idle_since >= self.idle_ttl:
+            self._idle_since = now
+            return max(active - 1, self.min_workers)
+        return max(active, self.min_workers)
+
+
+__all__ = ["Scaler", "Supervisor"]
@@ -1,45 +1,125 @@
 from __future__ import annotations
 
+import asyncio
 import json
 import os
+import shlex
+import shutil
 import signal
 import subprocess
 import sys
+import tempfile
 import time
 from dataclasses import dataclass
 from datetime import datetime, timezone
-from typing import Any, Dict, Optional
+from typing import IO, Any, Dict, List, Optional, Tuple, Union
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional dependency
+    orjson = None
 
 
 ISO_FORMAT = "%Y-%m-%dT%H:%M:%S.%fZ"
 
+# Only the tail of a command's stdout/stderr is kept in memory and stored.
+MAX_OUTPUT_BYTES = 64 * 1024
+# stderr only feeds jobs.last_error, so far less of it is kept.
+MAX_ERROR_BYTES = 5000
+
+# Commands containing any of these need a real shell to be interpreted.
+SHELL_METACHARS = frozenset("|&;<>()$`\\*?[]#~{}\n")
+SHELL_BUILTINS = frozenset(
+    {".", "alias", "cd", "eval", "exec", "exit", "export", "read", "return",
+     "set", "shift", "source", "trap", "ulimit", "umask", "unset", "wait"}
+)
+
 
 def utcnow() -> datetime:
     return datetime.now(timezone.utc)
 
 
 def to_iso(dt: datetime) -> str:
-    return dt.astimezone(timezone.utc).strftime(ISO_FORMAT)
+    # Equivalent to strftime(ISO_FORMAT); utcnow() values skip the conversion.
+    if dt.tzinfo is not timezone.utc:
+        dt = dt.astimezone(timezone.utc)
+    return dt.isoformat(timespec="microseconds")[:26] + "Z"
 
 
 def from_iso(value: str) -> datetime:
     return datetime.strptime(value, ISO_FORMAT).replace(tzinfo=timezone.utc)
 
 
-def load_json(value: str) -> Any:
+def normalize_iso(value: str) -> str:
+    # Stored timestamps are compared as strings, so they must share ISO_FORMAT.
+    try:
+        dt = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except ValueError as exc:
+        raise ValueError(f"Invalid ISO timestamp: {value}") from exc
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return to_iso(dt)
+
+
+def load_json(value: Union[str, bytes]) -> Any:
+    if orjson is not None:
+        return orjson.loads(value)
     return json.loads(value)
 
 
 def dump_json(data: Any, *, indent: Optional[int] = None) -> str:
+    if orjson is not None:
+        # orjson only supports two-space indentation.
+        option = orjson.OPT_NON_STR_KEYS | (orjson.OPT_INDENT_2 if indent else 0)
+        return orjson.dumps(data, option=option).decode("utf-8")
     return json.dumps(data, indent=indent, ensure_ascii=False)
 
 
-def run_command(command: str, timeout: Optional[int] = None) -> subprocess.CompletedProcess[str]:
+def split_command(command: str) -> Optional[Tuple[List[str], str]]:
+    if sys.platform == "win32" or any(char in SHELL_METACHARS for char in command):
+        return None
+    try:
+        args = shlex.split(command)
+    except ValueError:
+        return None
+    if not args or "=" in args[0] or args[0] in SHELL_BUILTINS:
+        return None
+    executable = shutil.which(args[0])
+    if executable is None:
+        return None
+    return args, executable
+
+
+def run_command(
+    command: str,
+    timeout: Optional[int] = None,
+    *,
+    stdout: Union[int, IO[bytes]] = subprocess.PIPE,
+    stderr: Union[int, IO[bytes]] = subprocess.PIPE,
+) -> subprocess.CompletedProcess[bytes]:
+    direct = split_command(command)
+    if direct is not None:
+        # Exec'ing the program directly skips /bin/sh and lets subprocess use
+        # posix_spawn (our own descriptors are already non-inheritable).
+        args, executable = direct
+        try:
+            return subprocess.run(
+                args,
+                executable=executable,
+                stdout=stdout,
+                stderr=stderr,
+                timeout=timeout,
+                close_fds=False,
+            )
+        except OSError:
+            # execve refused it (e.g. a script without a shebang), so the
+            # program never ran; let the shell interpret it as before.
+            pass
     return subprocess.run(
         command,
         shell=True,
-        capture_output=True,
-        text=True,
+        stdout=stdout,
+        stderr=stderr,
         timeout=timeout,
     )
 
@@ -48,13 +128,46 @@ def ensure_directory(path: str) -> None:
     os.makedirs(path, exist_ok=True)
 
 
+def is_queuectl_process(pid: int) -> Optional[bool]:
+    # Worker pids come from worker_heartbeats, which can be stale after a
+    # crash, and the pid may since belong to something else. Every worker
+    # (forked from the CLI or the supervisor, or worker_process) carries
+    # "queuectl" in its command line. None means there is no /proc to ask.
+    try:
+        with open(f"/proc/{pid}/cmdline", "rb") as fh:
+            return b"queuectl" in fh.read()
+    except FileNotFoundError:
+        return False if os.path.isdir("/proc/self") else None
+    except OSError:
+        return None
+
+
+def request_stop(pid: int) -> None:
+    # On Windows SIGTERM is TerminateProcess, so rely on the stop flag there.
+    if sys.platform == "win32" or is_queuectl_process(pid) is False:
+        return
+    try:
+        os.kill(pid, signal.SIGTERM)
+    except (ProcessLookupError, PermissionError):
+        return
+
+
 def terminate_process(pid: int) -> None:
+    # Workers treat SIGTERM as a graceful stop, so forcing one takes SIGKILL
+    # (Windows has none; SIGTERM there is already TerminateProcess).
+    sig = getattr(signal, "SIGKILL", signal.SIGTERM)
+    owner = is_queuectl_process(pid)
+    if owner is False:
+        return
     try:
-        if sys.platform == "win32":
-            os.kill(pid, signal.SIGTERM)
+        if sys.platform != "win32" and owner and os.getpgid(pid) == pid:
+            # Detached workers lead their own process group; signalling the
+            # group also stops the job command they are running. Without a
+            # confirmed queuectl pid, only that one process is signalled.
+            os.killpg(pid, sig)
         else:
-            os.kill(pid, signal.SIGTERM)
-    except ProcessLookupError:
+            os.kill(pid, sig)
+    except (ProcessLookupError, PermissionError):
         return
 
 
@@ -64,19 +177,99 @@ class CommandResult:
     stdout: str
     stderr: str
     duration: float
+    # Bytes the command wrote, before the tail cap.
+    stdout_len: int = 0
+    stderr_len: int = 0
 
 
-def execute_with_timing(command: str, timeout: Optional[int] = None) -> CommandResult:
+def read_tail(fh: IO[bytes], limit: int, *, strip: bool = False) -> str:
+    size = fh.seek(0, os.SEEK_END)
+    fh.seek(max(size - limit, 0))
+    data = fh.read()
+    if strip:
+        # Trim the raw bytes so only the kept text is decoded.
+        data = data.strip()
+    return data.decode("utf-8", errors="replace")
+
+
+def execute_with_timing(
+    command: str,
+    timeout: Optional[int] = None,
+    *,
+    max_output_bytes: int = MAX_OUTPUT_BYTES,
+    max_error_bytes: int = MAX_ERROR_BYTES,
+) -> CommandResult:
     start = time.perf_counter()
-    try:
-        proc = run_command(command, timeout=timeout)
-        exit_code = proc.returncode
-        stdout = proc.stdout or ""
-        stderr = proc.stderr or ""
-    except subprocess.TimeoutExpired as exc:
-        exit_code = -1
-        stdout = exc.stdout or ""
-        stderr = (exc.stderr or "") + "\n[queuectl] command timed out"
-    end = time.perf_counter()
-    return CommandResult(exit_code=exit_code, stdout=stdout, stderr=stderr, duration=end - start)
+    # Let the kernel buffer output in temp files rather than piping it all
+    # through Python; only the tail is read back.
+    with tempfile.TemporaryFile() as out, tempfile.TemporaryFile() as err:
+        timed_out = False
+        try:
+            exit_code = run_command(command, timeout=timeout, stdout=out, stderr=err).returncode
+        except subprocess.TimeoutExpired:
+            exit_code = -1
+            timed_out = True
+        return _command_result(
+            out, err, exit_code, timed_out, start, max_output_bytes, max_error_bytes
+        )
+
+
+async def execute_with_timing_async(
+    command: str,
+    timeout: Optional[int] = None,
+    *,
+    max_output_bytes: int = MAX_OUTPUT_BYTES,
+    max_error_bytes: int = MAX_ERROR_BYTES,
+) -> CommandResult:
+    start = time.perf_counter()
+    with tempfile.TemporaryFile() as out, tempfile.TemporaryFile() as err:
+        proc = None
+        direct = split_command(command)
+        if direct is not None:
+            args, executable = direct
+            try:
+                proc = await asyncio.create_subprocess_exec(
+                    *args, executable=executable, stdout=out, stderr=err, close_fds=False
+                )
+            except OSError:
+                # Same shell fallback as run_command().
+                pass
+        if proc is None:
+            proc = await asyncio.create_subprocess_shell(command, stdout=out, stderr=err)
+        timed_out = False
+        try:
+            exit_code = await asyncio.wait_for(proc.wait(), timeout)
+        except asyncio.TimeoutError:
+            proc.kill()
+            await proc.wait()
+            exit_code = -1
+            timed_out = True
+        return _command_result(
+            out, err, exit_code, timed_out, start, max_output_bytes, max_error_bytes
+        )
+
+
+def _command_result(
+    out: IO[bytes],
+    err: IO[bytes],
+    exit_code: int,
+    timed_out: bool,
+    start: float,
+    max_output_bytes: int,
+    max_error_bytes: int,
+) -> CommandResult:
+    stdout = read_tail(out, max_output_bytes)
+    stderr = read_tail(err, max_error_bytes, strip=True)
+    # read_tail leaves each file positioned at its end.
+    stdout_len, stderr_len = out.tell(), err.tell()
+    if timed_out:
+        stderr = "\n".join(filter(None, (stderr, "[queuectl] command timed out")))
+    return CommandResult(
+        exit_code=exit_code,
+        stdout=stdout,
+        stderr=stderr,
+        duration=time.perf_counter() - start,
+        stdout_len=stdout_len,
+        stderr_len=stderr_len,
+    )
 
@@ -1,13 +1,44 @@
 from __future__ import annotations
 
+import asyncio
+import functools
+import itertools
 import os
+import random
+import signal
+import threading
 import time
-import uuid
+from collections import deque
+from concurrent.futures import ALL_COMPLETED, FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
 from dataclasses import dataclass
-from typing import Optional
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
 
 from .storage import Job, Storage
-from .utils import CommandResult, execute_with_timing
+from .utils import MAX_ERROR_BYTES, CommandResult, execute_with_timing, execute_with_timing_async
+
+
+STOP_CHECK_INTERVAL = 1.0
+
+# How often an idle worker stats the wake file for newly enqueued jobs.
+WAKE_CHECK_INTERVAL = 0.25
+
+# The first idle wait is this fraction of poll_interval; later ones double.
+IDLE_BACKOFF_START = 0.25
+
+# Comma-separated CPU ids, e.g. "0,1,2,3"; worker i is pinned to the i-th
+# (wrapping around), where i is its index among the workers one command or
+# supervisor started.
+AFFINITY_ENV = "QUEUECTL_AFFINITY"
+
+# last_error for a failed command that printed nothing.
+DEFAULT_ERROR = "command failed"
+
+_WID_COUNTER = itertools.count()
+
+
+def new_worker_id() -> str:
+    # Unique while this process is alive; no urandom read per worker.
+    return f"worker-{os.getpid()}-{next(_WID_COUNTER):x}"
 
 
 @dataclass
@@ -15,6 +46,22 @@ class WorkerConfig:
     poll_interval: float
     backoff_base: int
     command_timeout: Optional[int]
+    max_poll_interval: float = 2.0
+    heartbeat_interval: float = 5.0
+    concurrency: int = 1
+    cpu_affinity: Tuple[int, ...] = ()
+
+
+def parse_affinity(value: Optional[str]) -> Tuple[int, ...]:
+    if not value or not value.strip():
+        return ()
+    try:
+        cpus = tuple(int(cpu) for cpu in value.split(","))
+    except ValueError:
+        cpus = (-1,)
+    if any(cpu < 0 for cpu in cpus):
+        raise ValueError(f"{AFFINITY_ENV} must be a comma-separated list of CPU ids, got {value!r}")
+    return cpus
 
 
 class WorkerRunner:
@@ -23,71 +70,406 @@ class WorkerRunner:
         storage: Storage,
         worker_id: Optional[str] = None,
         config: Optional[WorkerConfig] = None,
+        gate: Optional[Any] = None,
+        index: int = 0,
     ):
         self.storage = storage
-        self.worker_id = worker_id or f"worker-{uuid.uuid4().hex[:8]}"
+        self.worker_id = worker_id or new_worker_id()
+        # Position among the workers started together; picks the pinned CPU.
+        self.index = index
         if config is None:
-            poll_interval = float(self.storage.get_config("poll_interval"))
-            backoff_base = int(self.storage.get_config("backoff_base"))
-            timeout_val = int(self.storage.get_config("command_timeout"))
+            values = self.storage.get_configs(
+                [
+                    "poll_interval",
+                    "backoff_base",
+                    "command_timeout",
+                    "max_poll_interval",
+                    "heartbeat_interval",
+                    "concurrency",
+                ]
+            )
+            poll_interval = float(values["poll_interval"])
+            backoff_base = int(values["backoff_base"])
+            timeout_val = int(values["command_timeout"])
+            max_poll_interval = float(values["max_poll_interval"])
+            heartbeat_interval = float(values["heartbeat_interval"])
+            concurrency = int(values["concurrency"])
             config = WorkerConfig(
                 poll_interval=poll_interval,
                 backoff_base=backoff_base,
                 command_timeout=timeout_val if timeout_val > 0 else None,
+                max_poll_interval=max(max_poll_interval, poll_interval),
+                heartbeat_interval=heartbeat_interval,
+                concurrency=max(concurrency, 1),
+                cpu_affinity=parse_affinity(os.environ.get(AFFINITY_ENV)),
             )
         self.config = config
+        # Event cleared by the supervisor to park this worker without exiting.
+        self._gate = gate
         self._should_stop = False
+        self._stop_checked_at = 0.0
+        self._idle_misses = 0
+        # Set by request_stop() to end an idle wait early.
+        self._wake = threading.Event()
+        # Storage.enqueue_stamp() as of the last claim attempt.
+        self._enqueue_seen = 0
+        # Jobs claimed in one acquire_jobs() transaction but not yet run.
+        self._local_queue: deque[Job] = deque()
+        # Commands running on the executor when concurrency > 1.
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._inflight: Dict[Future, Job] = {}
+        # Last (state, details) written to worker_heartbeats and when.
+        self._reported: Optional[Tuple[str, Optional[str]]] = None
+        self._reported_at = 0.0
+        # Per-worker generator: no shared lock, and workers jitter differently.
+        self._rng = random.Random(self.worker_id)
 
     def run(self) -> None:
         pid = os.getpid()
-        self.storage.register_worker(self.worker_id, pid)
+        previous_handler = None
+        if threading.current_thread() is threading.main_thread():
+            # `worker stop` signals workers directly; finish the current job and exit.
+            previous_handler = signal.signal(signal.SIGTERM, self._handle_sigterm)
+        self._pin_cpu()
+        self.storage.register_worker(self.worker_id, pid, initial_state="idle")
+        # The registration row doubles as the first "idle" heartbeat.
+        self._reported = ("idle", None)
+        self._reported_at = time.monotonic()
+        self._executor = self._make_executor()
         try:
             self._loop()
         finally:
-            self.storage.update_worker_state(self.worker_id, state="exited", details=None)
+            if previous_handler is not None:
+                signal.signal(signal.SIGTERM, previous_handler)
+            if self._executor is not None:
+                # Let running commands finish and record their results.
+                self._collect(None, return_when=ALL_COMPLETED)
+                self._executor.shutdown()
+                self._executor = None
+            self.storage.flush()
+            self.storage.release_jobs(self._local_queue)
+            self._local_queue.clear()
+            self._set_state("exited", force=True)
             self.storage.remove_worker(self.worker_id)
 
+    def _make_executor(self) -> Optional[ThreadPoolExecutor]:
+        if self.config.concurrency <= 1:
+            return None
+        return ThreadPoolExecutor(
+            max_workers=self.config.concurrency, thread_name_prefix=self.worker_id
+        )
+
+    def _pin_cpu(self) -> None:
+        cpus = self.config.cpu_affinity
+        if not cpus or not hasattr(os, "sched_setaffinity"):
+            return
+        cpu = cpus[self.index % len(cpus)]
+        try:
+            # pid 0 is the calling thread.
+            os.sched_setaffinity(0, {cpu})
+        except OSError:
+            pass
+
     def _loop(self) -> None:
         while True:
-            if self._should_stop or self.storage.stop_requested():
+            if self._stop_pending():
                 break
+            if self._gate is not None and not self._gate.is_set():
+                self._park()
+                continue
 
-            job = self.storage.acquire_job()
-            if job is None:
-                self.storage.update_worker_state(self.worker_id, state="idle", details=None)
-                time.sleep(self.config.poll_interval)
+            free_slots = self.config.concurrency - len(self._inflight)
+            job = self._next_job(free_slots) if free_slots > 0 else None
+            if job is None and not self._inflight:
+                # Land any grouped results before going quiet.
+                self.storage.flush()
+                self._set_state("idle")
+                if self._idle_wait(self._idle_delay()):
+                    self._idle_misses = 0
+                    continue
+                self._idle_misses = min(self._idle_misses + 1, 32)
                 continue
 
-            self.storage.update_worker_state(
-                self.worker_id,
-                state="processing",
-                details=f"job={job.id} attempts={job.attempts}/{job.max_retries}",
-            )
-            result = self._execute(job)
-            if result.exit_code == 0:
-                self.storage.mark_completed(job.id, result.stdout)
+            if self._executor is None:
+                self._set_state("processing", f"job={job.id} attempts={job.attempts}/{job.max_retries}")
+                self._finish(job, self._execute(job))
+                continue
+            if job is not None:
+                self._inflight[self._executor.submit(self._execute, job)] = job
+                self._set_state("processing", f"{len(self._inflight)} job(s) in flight")
+                continue
+
+            # Every slot is busy, or nothing is claimable yet: wait for a
+            # command to finish (backing off like an idle poll in the latter case).
+            if free_slots > 0:
+                timeout = self._idle_delay()
+                self._idle_misses = min(self._idle_misses + 1, 32)
             else:
-                error_summary = result.stderr.strip() or result.stdout.strip() or "command failed"
-                self.storage.mark_failed(
-                    job,
-                    exit_code=result.exit_code,
-                    error=error_summary[:5000],
-                    backoff_base=self.config.backoff_base,
-                )
+                timeout = STOP_CHECK_INTERVAL
+            self._collect(timeout)
+
+        self._set_state("stopped", "stop requested", force=True)
+
+    def _next_job(self, free_slots: int) -> Optional[Job]:
+        if not self._local_queue:
+            # Read before claiming, so an enqueue racing the claim still
+            # ends the idle wait that follows.
+            self._enqueue_seen = self.storage.enqueue_stamp()
+            # One transaction claims a job for every free slot, and no more:
+            # anything extra would sit in 'processing' behind this worker
+            # while other workers idle.
+            self._local_queue.extend(self.storage.acquire_jobs(max(free_slots, 1)))
+            if not self._local_queue:
+                return None
+        self._idle_misses = 0
+        return self._local_queue.popleft()
+
+    def _collect(self, timeout: Optional[float], return_when: str = FIRST_COMPLETED) -> None:
+        done, _ = wait(self._inflight, timeout=timeout, return_when=return_when)
+        for future in done:
+            self._finish(self._inflight.pop(future), future.result())
+
+    def _finish(self, job: Job, result: CommandResult) -> None:
+        if result.exit_code == 0:
+            self.storage.mark_completed(job.id, result.stdout)
+            return
+        # stderr arrives stripped and capped; stdout is only a fallback.
+        if result.stderr:
+            error_summary = result.stderr
+        elif result.stdout_len:
+            error_summary = result.stdout.rstrip()[-MAX_ERROR_BYTES:] or DEFAULT_ERROR
+        else:
+            error_summary = DEFAULT_ERROR
+        self.storage.mark_failed(
+            job,
+            exit_code=result.exit_code,
+            error=error_summary,
+            backoff_base=self.config.backoff_base,
+        )
 
-            self.storage.update_worker_state(self.worker_id, state="running", details=None)
+    def _park(self) -> None:
+        # Hand back claimed jobs so active workers can run them.
+        self.storage.release_jobs(self._local_queue)
+        self._local_queue.clear()
+        self._set_state("parked")
+        self._gate.wait(STOP_CHECK_INTERVAL)
 
-        self.storage.update_worker_state(self.worker_id, state="stopped", details="stop requested")
+    def request_stop(self) -> None:
+        # Thread-safe; an idle worker wakes up instead of finishing its sleep.
+        self._should_stop = True
+        self._wake.set()
+
+    def _handle_sigterm(self, signum, frame) -> None:
+        self.request_stop()
+
+    def _idle_wait(self, timeout: float) -> bool:
+        # Sleep in slices, checking the wake file and the stop flag between
+        # them: both can be set from another process (the stop flag is the
+        # only signal workers get on Windows). Returns True when woken early.
+        deadline = time.monotonic() + timeout
+        while not self._stop_pending() and not self._jobs_enqueued():
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return False
+            if self._wake.wait(min(remaining, WAKE_CHECK_INTERVAL)):
+                self._wake.clear()
+                return True
+        return True
+
+    def _jobs_enqueued(self) -> bool:
+        return self.storage.enqueue_stamp() != self._enqueue_seen
+
+    def _stop_pending(self) -> bool:
+        # Signals cover local workers; the shared stop flag is only re-read
+        # about once a second when jobs are completing back to back.
+        if self._should_stop:
+            return True
+        now = time.monotonic()
+        if now - self._stop_checked_at >= STOP_CHECK_INTERVAL:
+            self._stop_checked_at = now
+            self._should_stop = self.storage.stop_requested()
+        return self._should_stop
+
+    def _set_state(self, state: str, details: Optional[str] = None, *, force: bool = False) -> None:
+        # Skip rewriting an unchanged state until the row is due a heartbeat.
+        now = time.monotonic()
+        if (
+            not force
+            and self._reported == (state, details)
+            and now - self._reported_at < self.config.heartbeat_interval
+        ):
+            return
+        self.storage.update_worker_state(self.worker_id, state=state, details=details)
+        self._reported = (state, details)
+        self._reported_at = now
+
+    def _idle_delay(self) -> float:
+        # Back off exponentially while the queue stays empty, with +/-25% jitter
+        # so idle workers do not poll SQLite in lockstep. Starting below
+        # poll_interval keeps the cap, and so the worst-case pickup delay, low.
+        delay = min(
+            self.config.poll_interval * IDLE_BACKOFF_START * (2 ** self._idle_misses),
+            self.config.max_poll_interval,
+        )
+        return delay * self._rng.uniform(0.75, 1.25)
 
     def _execute(self, job: Job) -> CommandResult:
         return execute_with_timing(job.command, timeout=self.config.command_timeout)
 
 
-def run_worker(worker_id: Optional[str] = None) -> None:
+class AsyncWorkerRunner(WorkerRunner):
+    # Runs up to `concurrency` commands as asyncio subprocesses on one thread.
+    # SQLite calls go through a single helper thread so the event loop never
+    # blocks on a busy database and all writes share one connection.
+
+    # Wakes the event loop's own idle wait; set while _loop_async runs.
+    _notify: Optional[Callable[[], None]] = None
+
+    def _make_executor(self) -> Optional[ThreadPoolExecutor]:
+        return None
+
+    def request_stop(self) -> None:
+        super().request_stop()
+        notify = self._notify
+        if notify is not None:
+            notify()
+
+    def _loop(self) -> None:
+        with ThreadPoolExecutor(max_workers=1, thread_name_prefix=f"{self.worker_id}-db") as db:
+            asyncio.run(self._loop_async(db))
+
+    async def _loop_async(self, db: ThreadPoolExecutor) -> None:
+        loop = asyncio.get_running_loop()
+
+        def call(func: Callable, *args):
+            return loop.run_in_executor(db, func, *args)
+
+        wake = asyncio.Event()
+
+        def notify() -> None:
+            loop.call_soon_threadsafe(wake.set)
+
+        slots = asyncio.Semaphore(self.config.concurrency)
+        tasks: Set[asyncio.Task] = set()
+        self._notify = notify
+        try:
+            while not self._stop_pending():
+                if self._gate is not None and not self._gate.is_set():
+                    await call(self._park)
+                    continue
+                await slots.acquire()
+                # Waiting for a free slot can outlast a stop request.
+                if self._stop_pending():
+                    slots.release()
+                    break
+                # The slot just acquired has no task yet, so it counts as free.
+                job = await call(self._next_job, self.config.concurrency - len(tasks))
+                if job is None:
+                    slots.release()
+                    if not tasks:
+                        await call(self.storage.flush)
+                        await call(self._set_state, "idle")
+                    if await self._idle_wait_async(wake, self._idle_delay()):
+                        self._idle_misses = 0
+                    else:
+                        self._idle_misses = min(self._idle_misses + 1, 32)
+                    continue
+                task = asyncio.create_task(self._run_job(job, slots, call))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+            # Let running commands finish and record their results.
+            if tasks:
+                await asyncio.gather(*tasks)
+            await call(functools.partial(self._set_state, "stopped", "stop requested", force=True))
+        finally:
+            self._notify = None
+
+    async def _idle_wait_async(self, wake: asyncio.Event, timeout: float) -> bool:
+        # Same slicing as _idle_wait(), on the event loop.
+        deadline = time.monotonic() + timeout
+        while not self._stop_pending() and not self._jobs_enqueued():
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return False
+            try:
+                await asyncio.wait_for(wake.wait(), min(remaining, WAKE_CHECK_INTERVAL))
+            except asyncio.TimeoutError:
+                continue
+            wake.clear()
+            return True
+        return True
+
+    async def _run_job(self, job: Job, slots: asyncio.Semaphore, call: Callable) -> None:
+        try:
+            await call(
+                self._set_state,
+                "processing",
+                f"job={job.id} attempts={job.attempts}/{job.max_retries}",
+            )
+            result = await execute_with_timing_async(job.command, timeout=self.config.command_timeout)
+            await call(self._finish, job, result)
+        finally:
+            slots.release()
+
+
+class WorkerPool:
+    def __init__(self, count: int, storage: Optional[Storage] = None, *, use_async: bool = False):
+        # Threads share one Storage; Database hands each its own connection.
+        self.storage = storage or Storage()
+        runner_cls = AsyncWorkerRunner if use_async else WorkerRunner
+        self.runners = [runner_cls(storage=self.storage, index=index) for index in range(count)]
+        self._threads: List[threading.Thread] = []
+
+    @property
+    def worker_ids(self) -> List[str]:
+        return [runner.worker_id for runner in self.runners]
+
+    def start(self) -> None:
+        for runner in self.runners:
+            thread = threading.Thread(target=runner.run, name=runner.worker_id, daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self) -> None:
+        for runner in self.runners:
+            runner.request_stop()
+
+    def join(self) -> None:
+        for thread in self._threads:
+            # Short timeouts keep the main thread responsive to signals.
+            while thread.is_alive():
+                thread.join(STOP_CHECK_INTERVAL)
+        self._threads.clear()
+
+    def run(self) -> None:
+        previous = {}
+        if threading.current_thread() is threading.main_thread():
+            for signum in (signal.SIGINT, signal.SIGTERM):
+                previous[signum] = signal.signal(signum, self._handle_signal)
+        self.start()
+        try:
+            self.join()
+        finally:
+            for signum, handler in previous.items():
+                signal.signal(signum, handler)
+
+    def _handle_signal(self, signum, frame) -> None:
+        self.stop()
+
+
+def run_worker(worker_id: Optional[str] = None, *, use_async: bool = False, index: int = 0) -> None:
     storage = Storage()
-    runner = WorkerRunner(storage=storage, worker_id=worker_id)
+    runner_cls = AsyncWorkerRunner if use_async else WorkerRunner
+    runner = runner_cls(storage=storage, worker_id=worker_id, index=index)
     runner.run()
 
 
-__all__ = ["WorkerRunner", "WorkerConfig", "run_worker"]
+__all__ = [
+    "WorkerRunner",
+    "AsyncWorkerRunner",
+    "WorkerConfig",
+    "WorkerPool",
+    "new_worker_id",
+    "run_worker",
+]
 
@@ -1,17 +1,39 @@
 from __future__ import annotations
 
-import argparse
+import sys
+from typing import List, Optional
 
 from .worker import run_worker
 
 
-def main() -> None:
-    parser = argparse.ArgumentParser(description="queuectl worker process")
-    parser.add_argument("--worker-id", dest="worker_id", help="Identifier for this worker", default=None)
-    args = parser.parse_args()
-    run_worker(worker_id=args.worker_id)
+USAGE = "usage: python -m queuectl.worker_process [-h] [--worker-id ID] [--async]"
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    # Parsed by hand: importing argparse costs more than this process needs.
+    args = sys.argv[1:] if argv is None else argv
+    worker_id = None
+    use_async = False
+    index = 0
+    while index < len(args):
+        arg = args[index]
+        if arg in ("--worker-id", "-w") and index + 1 < len(args):
+            worker_id = args[index + 1]
+            index += 1
+        elif arg.startswith("--worker-id="):
+            worker_id = arg.partition("=")[2]
+        elif arg == "--async":
+            use_async = True
+        elif arg in ("-h", "--help"):
+            print(USAGE)
+            sys.exit(0)
+        else:
+            # Same status argparse uses for usage errors.
+            print(f"{USAGE}\nunrecognized argument: {arg}", file=sys.stderr)
+            sys.exit(2)
+        index += 1
+    run_worker(worker_id=worker_id, use_async=use_async)
 
 
 if __name__ == "__main__":
     main()
-
@@ -6,11 +6,15 @@ import json
 import subprocess
 import sys
 import time
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
+from typing import Callable
 
 
 PROJECT_ROOT = Path(__file__).resolve().parents[1]
 DB_PATH = PROJECT_ROOT / "queuectl.db"
+POLL_INTERVAL = 0.05
+WAIT_TIMEOUT = 30.0
 
 
 def run_cli(*args: str) -> subprocess.CompletedProcess[str]:
@@ -19,6 +23,36 @@ def run_cli(*args: str) -> subprocess.CompletedProcess[str]:
     return subprocess.run(cmd, check=True, text=True)
 
 
+def start_workers(count: int = 1) -> subprocess.Popen[str]:
+    # In-process workers: one interpreter hosts every worker thread.
+    cmd = [sys.executable, "-m", "queuectl", "worker", "start", "--count", str(count), "--inproc"]
+    print(f"$ {' '.join(cmd)} &")
+    return subprocess.Popen(cmd, text=True)
+
+
+def stop_workers(process: subprocess.Popen[str]) -> None:
+    run_cli("worker", "stop")
+    process.wait(timeout=WAIT_TIMEOUT)
+
+
+def status_json() -> dict:
+    cmd = [sys.executable, "-m", "queuectl", "status", "--json"]
+    return json.loads(subprocess.run(cmd, check=True, text=True, capture_output=True).stdout)
+
+
+def wait_until(condition: Callable[[], bool], timeout: float = WAIT_TIMEOUT) -> None:
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            raise TimeoutError(f"condition not met within {timeout:.0f}s")
+        time.sleep(POLL_INTERVAL)
+
+
+def queue_settled() -> bool:
+    status = status_json()
+    return status["queue_depth"] + status["processing"] == 0
+
+
 def main() -> None:
     if DB_PATH.exists():
         DB_PATH.unlink()
@@ -38,23 +72,22 @@ def main() -> None:
         "max_retries": 2,
     }
 
-    run_cli("enqueue", json.dumps(success_job))
-    run_cli("enqueue", json.dumps(fail_job))
+    jobs = [success_job, fail_job]
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        list(pool.map(lambda job: run_cli("enqueue", json.dumps(job)), jobs))
 
-    run_cli("worker", "start", "--count", "1")
+    workers = start_workers()
 
-    time.sleep(8)
+    wait_until(queue_settled)
     run_cli("status")
 
-    run_cli("worker", "stop")
-
-    time.sleep(1)
+    stop_workers(workers)
     run_cli("dlq", "list")
 
     run_cli("dlq", "retry", "demo-fail")
-    run_cli("worker", "start", "--count", "1")
-    time.sleep(6)
-    run_cli("worker", "stop")
+    workers = start_workers()
+    wait_until(queue_settled)
+    stop_workers(workers)
     run_cli("status")
 
 
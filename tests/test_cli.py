@@ -0,0 +1,138 @@
+from __future__ import annotations
+
+import collections.abc
+import json
+import os
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+from typer.testing import CliRunner
+
+from queuectl import cli
+from queuectl.storage import Storage
+
+
+class CliTestCase(unittest.TestCase):
+    def setUp(self):
+        # The CLI opens queuectl.db in the working directory.
+        self.tmp = tempfile.TemporaryDirectory()
+        self.cwd = os.getcwd()
+        os.chdir(self.tmp.name)
+        self.runner = CliRunner()
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        self.tmp.cleanup()
+
+    def invoke(self, *args: str):
+        result = self.runner.invoke(cli.app, list(args))
+        self.assertEqual(result.exit_code, 0, result.output)
+        return result
+
+
+class BulkEnqueueTests(CliTestCase):
+    def enqueue_file(self, name: str, text: str) -> list:
+        Path(name).write_text(text)
+        received = []
+        enqueue_many = Storage.enqueue_many
+
+        def _spy(storage, payloads):
+            received.append(payloads)
+            return enqueue_many(storage, payloads)
+
+        with mock.patch.object(Storage, "enqueue_many", _spy):
+            result = self.invoke("enqueue", "--file", name)
+        self.assertIn("Enqueued 3 job(s)", result.output)
+        self.assertEqual(len(received), 1)
+        return received[0]
+
+    def test_jsonl_file_is_streamed(self):
+        lines = "\n".join(json.dumps({"id": f"job-{i}", "command": "true"}) for i in range(3))
+        payloads = self.enqueue_file("jobs.jsonl", lines + "\n\n")
+        self.assertIsInstance(payloads, collections.abc.Iterator)
+        self.assertEqual(Storage().job_summary()["pending"], 3)
+
+    @unittest.skipIf(cli.ijson is None, "ijson is not installed")
+    def test_json_array_is_streamed(self):
+        jobs = [{"id": f"job-{i}", "command": "true", "priority": 1.0} for i in range(3)]
+        payloads = self.enqueue_file("jobs.json", "  \n" + json.dumps(jobs))
+        self.assertIsInstance(payloads, collections.abc.Iterator)
+        self.assertEqual(Storage().get_job("job-2").priority, 1)
+
+    def test_invalid_line_enqueues_nothing(self):
+        Path("jobs.jsonl").write_text('{"id": "good", "command": "true"}\n{not json\n')
+        result = self.runner.invoke(cli.app, ["enqueue", "--file", "jobs.jsonl"])
+        self.assertNotEqual(result.exit_code, 0)
+        self.assertIn("line 2", result.output)
+        self.assertIsNone(Storage().get_job("good"))
+
+
+class EnqueueValidationTests(CliTestCase):
+    def test_bad_available_at_is_a_usage_error(self):
+        for args in (
+            ["enqueue", "--command", "true", "--available-at", "tomorrow"],
+            ["enqueue", '{"command": "true", "available_at": "tomorrow"}'],
+        ):
+            with self.subTest(args=args):
+                result = self.runner.invoke(cli.app, args)
+                self.assertEqual(result.exit_code, 2, result.output)
+                self.assertIn("Invalid ISO timestamp", result.output)
+
+    def test_duplicate_id_is_a_usage_error(self):
+        self.invoke("enqueue", "--id", "dup", "--command", "true")
+        result = self.runner.invoke(cli.app, ["enqueue", "--id", "dup", "--command", "true"])
+        self.assertEqual(result.exit_code, 2, result.output)
+        self.assertIn("already exists", result.output)
+
+
+class StatusTests(CliTestCase):
+    def status_json(self, *args: str) -> dict:
+        return json.loads(self.invoke("status", "--json", *args).output)
+
+    def test_json_summary(self):
+        storage = Storage()
+        storage.enqueue_many({"id": f"job-{i}", "command": "true"} for i in range(4))
+        storage.enqueue({"id": "later", "command": "true", "available_at": "2999-01-01T00:00:00Z"})
+        (job,) = storage.acquire_jobs(1)
+        storage.mark_completed(job.id, "ok")
+        storage.acquire_jobs(1)
+        status = self.status_json()
+        self.assertEqual(status["jobs"]["pending"], 3)
+        self.assertEqual(status["jobs"]["completed"], 1)
+        self.assertEqual(status["processing"], 1)
+        # Scheduled jobs still count towards the queue depth.
+        self.assertEqual(status["queue_depth"], 3)
+        self.assertEqual(status["workers"], [])
+
+    def test_since_filters_by_update_time(self):
+        storage = Storage()
+        storage.enqueue({"id": "old", "command": "true"})
+        self.assertEqual(self.status_json("--since", "2999-01-01T00:00:00Z")["jobs"]["pending"], 0)
+        self.assertEqual(self.status_json("--since", "2000-01-01")["jobs"]["pending"], 1)
+
+    def test_bad_since_is_a_usage_error(self):
+        result = self.runner.invoke(cli.app, ["status", "--since", "yesterday"])
+        self.assertEqual(result.exit_code, 2, result.output)
+
+
+class PaginationTests(CliTestCase):
+    def setUp(self):
+        super().setUp()
+        Storage().enqueue_many({"id": f"job-{i}", "command": "true"} for i in range(5))
+
+    def test_limit_shows_a_hint_for_the_next_page(self):
+        output = self.invoke("list", "--limit", "2").output
+        self.assertIn("use --offset 2 for more", output)
+
+    def test_last_page_has_no_hint(self):
+        output = self.invoke("list", "--limit", "2", "--offset", "4").output
+        self.assertNotIn("for more", output)
+
+    def test_offset_past_the_end(self):
+        self.assertIn("No jobs found", self.invoke("list", "--offset", "5").output)
+
+
+if __name__ == "__main__":
+    unittest.main()
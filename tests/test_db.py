@@ -0,0 +1,107 @@
+from __future__ import annotations
+
+import os
+import sqlite3
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+from queuectl.db import SCHEMA_VERSION, Database, get_database
+
+
+class MigrationTests(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = Path(self.tmp.name) / "queuectl.db"
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def open(self) -> Database:
+        db = Database(self.path)
+        db.init()
+        self.addCleanup(db.close)
+        return db
+
+    def insert_legacy_jobs(self, rows) -> None:
+        # As an older queuectl left them: raw available_at, user_version 0.
+        self.open()
+        conn = sqlite3.connect(self.path)
+        with conn:
+            conn.executemany(
+                "INSERT INTO jobs (id, command, state, max_retries, created_at, updated_at, available_at) "
+                "VALUES (?, 'true', 'pending', 3, '2026-01-01T00:00:00.000000Z', "
+                "'2026-01-01T00:00:00.000000Z', ?)",
+                rows,
+            )
+            conn.execute("PRAGMA user_version = 0")
+        conn.close()
+
+    def available_at(self, db: Database) -> dict:
+        return db.read(lambda conn: dict(conn.execute("SELECT id, available_at FROM jobs").fetchall()))
+
+    def test_legacy_timestamps_are_normalized_once(self):
+        self.insert_legacy_jobs(
+            [
+                ("offset", "2026-01-01T02:00:00+02:00"),
+                ("naive", "2026-01-01 00:00:01"),
+                ("canonical", "2026-01-01T00:00:02.000000Z"),
+                ("garbage", "tomorrow"),
+            ]
+        )
+        db = self.open()
+        self.assertEqual(
+            self.available_at(db),
+            {
+                "offset": "2026-01-01T00:00:00.000000Z",
+                "naive": "2026-01-01T00:00:01.000000Z",
+                "canonical": "2026-01-01T00:00:02.000000Z",
+                "garbage": "tomorrow",
+            },
+        )
+        version = db.read(lambda conn: conn.execute("PRAGMA user_version").fetchone()[0])
+        self.assertEqual(version, SCHEMA_VERSION)
+
+    def test_migrated_database_is_not_rescanned(self):
+        self.open()
+        conn = sqlite3.connect(self.path)
+        with conn:
+            conn.execute(
+                "INSERT INTO jobs (id, command, state, max_retries, created_at, updated_at, available_at) "
+                "VALUES ('late', 'true', 'pending', 3, 'x', 'x', '2026-01-01 00:00:00')"
+            )
+        conn.close()
+        self.assertEqual(self.available_at(self.open()), {"late": "2026-01-01 00:00:00"})
+
+
+class GetDatabaseTests(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.cwd = os.getcwd()
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        self.tmp.cleanup()
+
+    def test_one_instance_and_exit_hook_per_file(self):
+        os.chdir(self.tmp.name)
+        with mock.patch("atexit.register") as register:
+            db = get_database()
+            self.assertIs(get_database(Path("queuectl.db")), db)
+            self.assertIs(get_database(Path(self.tmp.name) / "queuectl.db"), db)
+        self.addCleanup(db.close)
+        register.assert_called_once_with(db.close)
+        self.assertTrue(db.db_path.is_absolute())
+
+    def test_connections_skip_init_once_initialized(self):
+        db = get_database(Path(self.tmp.name) / "queuectl.db")
+        self.addCleanup(db.close)
+        with mock.patch.object(db, "init") as init:
+            db.connection()
+            db.reader()
+        init.assert_not_called()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,271 @@
+from __future__ import annotations
+
+import os
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import threading
+import unittest
+from pathlib import Path
+from unittest import mock
+
+from queuectl.db import get_database
+from queuectl.storage import Storage
+
+
+class StorageTestCase(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.db = get_database(Path(self.tmp.name) / "queuectl.db")
+        self.storage = Storage(self.db)
+
+    def tearDown(self):
+        self.db.close()
+        self.tmp.cleanup()
+
+
+class ReleaseJobsTests(StorageTestCase):
+    def test_acquire_claims_at_most_limit(self):
+        self.storage.enqueue_many({"id": f"job-{i}", "command": "true"} for i in range(5))
+        jobs = self.storage.acquire_jobs(2)
+        self.assertEqual(len(jobs), 2)
+        self.assertEqual(self.storage.job_summary()["processing"], 2)
+
+    def test_release_undoes_the_claim(self):
+        self.storage.enqueue_many({"id": f"job-{i}", "command": "true"} for i in range(3))
+        jobs = self.storage.acquire_jobs(3)
+        self.storage.release_jobs(jobs)
+        for job in jobs:
+            released = self.storage.get_job(job.id)
+            self.assertEqual(released.state, "pending")
+            self.assertEqual(released.attempts, 0)
+            self.assertIsNone(released.started_at)
+        self.assertEqual(len(self.storage.acquire_jobs(3)), 3)
+
+    def test_released_retry_goes_back_to_failed(self):
+        job = self.storage.enqueue({"id": "retry", "command": "false", "max_retries": 3})
+        (claimed,) = self.storage.acquire_jobs(1)
+        self.storage.mark_failed(claimed, exit_code=1, error="boom", backoff_base=0)
+        self.storage.flush()
+        (reclaimed,) = self.storage.acquire_jobs(1)
+        self.assertEqual(reclaimed.attempts, 2)
+        self.storage.release_jobs([reclaimed])
+        released = self.storage.get_job(job.id)
+        self.assertEqual(released.state, "failed")
+        self.assertEqual(released.attempts, 1)
+
+    def test_release_leaves_finished_jobs_alone(self):
+        self.storage.enqueue({"id": "done", "command": "true"})
+        (job,) = self.storage.acquire_jobs(1)
+        self.storage.mark_completed(job.id, "ok")
+        self.storage.flush()
+        self.storage.release_jobs([job])
+        self.assertEqual(self.storage.get_job("done").state, "completed")
+
+    def test_release_of_nothing_is_a_no_op(self):
+        self.storage.release_jobs([])
+
+
+class EnqueueManyTests(StorageTestCase):
+    def test_enqueues_every_payload(self):
+        count = self.storage.enqueue_many({"id": f"job-{i}", "command": "true"} for i in range(50))
+        self.assertEqual(count, 50)
+        self.assertEqual(self.storage.job_summary()["pending"], 50)
+
+    def test_payloads_are_inserted_as_they_are_read(self):
+        writer = self.db.connection()
+        seen = []
+
+        def payloads():
+            for i in range(100):
+                # From the second payload on, earlier rows are already being
+                # inserted: nothing collected the payloads up front.
+                seen.append(writer.in_transaction)
+                yield {"id": f"job-{i}", "command": "true"}
+
+        self.assertEqual(self.storage.enqueue_many(payloads()), 100)
+        self.assertEqual(len(seen), 100)
+        self.assertTrue(all(seen[1:]))
+
+    def test_bad_payload_rolls_back_the_import(self):
+        def payloads():
+            yield {"id": "good", "command": "true"}
+            yield {"id": "bad"}
+
+        with self.assertRaises(ValueError):
+            self.storage.enqueue_many(payloads())
+        self.assertIsNone(self.storage.get_job("good"))
+
+    def test_duplicate_id_rolls_back_the_import(self):
+        self.storage.enqueue({"id": "taken", "command": "true"})
+        with self.assertRaises(ValueError):
+            self.storage.enqueue_many([{"id": "new", "command": "true"}, {"id": "taken", "command": "true"}])
+        self.assertIsNone(self.storage.get_job("new"))
+
+    def test_empty_import(self):
+        self.assertEqual(self.storage.enqueue_many(iter(())), 0)
+
+
+class ListingTests(StorageTestCase):
+    def setUp(self):
+        super().setUp()
+        for i in range(5):
+            self.storage.enqueue({"id": f"job-{i}", "command": "true"})
+
+    def test_pages_cover_every_job_once(self):
+        pages = [
+            [job.id for job in self.storage.iter_jobs(limit=2, offset=offset)] for offset in (0, 2, 4)
+        ]
+        self.assertEqual([len(page) for page in pages], [2, 2, 1])
+        self.assertEqual(sorted(sum(pages, [])), [f"job-{i}" for i in range(5)])
+
+    def test_newest_first_and_state_filter(self):
+        (job,) = self.storage.acquire_jobs(1)
+        self.storage.mark_completed(job.id, "ok")
+        self.assertEqual(self.storage.list_jobs()[0].id, job.id)
+        self.assertEqual([j.id for j in self.storage.list_jobs(state="completed")], [job.id])
+        self.assertEqual(len(self.storage.list_jobs(state="pending", limit=10)), 4)
+
+    def test_summary_since(self):
+        summary = self.storage.job_summary(since="2999-01-01T00:00:00Z")
+        self.assertEqual(summary, dict.fromkeys(["pending", "processing", "completed", "failed", "dead"], 0))
+        self.assertEqual(self.storage.job_summary(since="2000-01-01")["pending"], 5)
+        with self.assertRaises(ValueError):
+            self.storage.job_summary(since="yesterday")
+
+
+class EnqueueStampTests(StorageTestCase):
+    def test_stamp_changes_when_jobs_become_runnable(self):
+        before = self.storage.enqueue_stamp()
+        self.storage.enqueue({"id": "one", "command": "true"})
+        after_enqueue = self.storage.enqueue_stamp()
+        self.assertNotEqual(after_enqueue, before)
+        jobs = self.storage.acquire_jobs(1)
+        self.assertEqual(self.storage.enqueue_stamp(), after_enqueue)
+        self.storage.release_jobs(jobs)
+        self.assertNotEqual(self.storage.enqueue_stamp(), after_enqueue)
+
+    def test_stamp_is_shared_across_storages(self):
+        other = Storage(get_database(self.db.db_path))
+        before = other.enqueue_stamp()
+        self.storage.enqueue({"id": "one", "command": "true"})
+        self.assertNotEqual(other.enqueue_stamp(), before)
+
+class FlusherTests(StorageTestCase):
+    def enable(self):
+        # A long window keeps the background thread from writing first.
+        self.storage.set_config("group_commit_interval", "60")
+
+    def claim(self, job_id: str):
+        self.storage.enqueue({"id": job_id, "command": "true"})
+        (job,) = self.storage.acquire_jobs(1)
+        return job
+
+    def test_group_commit_is_off_by_default(self):
+        self.assertIsNone(self.storage._get_flusher())
+        job = self.claim("direct")
+        self.storage.mark_completed(job.id, "ok")
+        self.assertEqual(self.storage.get_job(job.id).state, "completed")
+
+    def test_flush_commits_queued_results(self):
+        self.enable()
+        job = self.claim("queued")
+        self.storage.mark_completed(job.id, "ok")
+        self.assertEqual(self.storage.get_job(job.id).state, "processing")
+        self.storage.flush()
+        self.assertEqual(self.storage.get_job(job.id).state, "completed")
+
+    def test_results_are_flushed_at_exit(self):
+        self.enable()
+        job = self.claim("at-exit")
+        self.db.close()
+        script = (
+            "import sys\n"
+            "from pathlib import Path\n"
+            "from queuectl.db import get_database\n"
+            "from queuectl.storage import Storage\n"
+            "Storage(get_database(Path(sys.argv[1]))).mark_completed(sys.argv[2], 'ok')\n"
+        )
+        src = str(Path(__file__).resolve().parents[1] / "src")
+        env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [src, os.environ.get("PYTHONPATH")])))
+        subprocess.run(
+            [sys.executable, "-c", script, str(self.db.db_path), job.id], env=env, check=True, timeout=30
+        )
+        self.assertEqual(self.storage.get_job(job.id).state, "completed")
+
+    def test_failed_batch_is_rewritten_by_the_caller(self):
+        self.enable()
+        job = self.claim("transient")
+        self.storage.mark_completed(job.id, "ok")
+        transaction = self.db.transaction
+        calls = []
+
+        def _fail_once(func):
+            calls.append(func)
+            if len(calls) == 1:
+                raise sqlite3.OperationalError("database is locked")
+            return transaction(func)
+
+        with mock.patch.object(self.db, "transaction", _fail_once):
+            self.storage.flush()
+        self.assertEqual(len(calls), 2)
+        self.assertEqual(self.storage.get_job(job.id).state, "completed")
+
+    def test_persistent_error_is_raised_and_other_results_land(self):
+        self.enable()
+        job = self.claim("good")
+        self.storage._get_flusher().submit("UPDATE no_such_table SET x = ?", (1,))
+        self.storage.mark_completed(job.id, "ok")
+        with self.assertRaises(sqlite3.OperationalError):
+            self.storage.flush()
+        self.assertEqual(self.storage.get_job(job.id).state, "completed")
+        # Reported once; the flusher keeps working afterwards.
+        job = self.claim("after-error")
+        self.storage.mark_completed(job.id, "ok")
+        self.storage.flush()
+        self.assertEqual(self.storage.get_job(job.id).state, "completed")
+
+    def test_threads_share_one_flusher(self):
+        self.enable()
+        barrier = threading.Barrier(8)
+        flushers = []
+
+        def _get():
+            barrier.wait()
+            flushers.append(self.storage._get_flusher())
+
+        threads = [threading.Thread(target=_get) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(flushers), 8)
+        self.assertEqual(len({id(flusher) for flusher in flushers}), 1)
+
+    @unittest.skipUnless(hasattr(os, "fork"), "needs os.fork")
+    def test_forked_child_starts_its_own_flusher(self):
+        self.enable()
+        parent_flusher = self.storage._get_flusher()
+        job = self.claim("forked")
+        # Forked children must not inherit an open SQLite connection.
+        self.db.close()
+        pid = os.fork()
+        if pid == 0:
+            status = 1
+            try:
+                flusher = self.storage._get_flusher()
+                if flusher is not parent_flusher and flusher.pid == os.getpid():
+                    self.storage.mark_completed(job.id, "ok")
+                    self.storage.flush()
+                    status = 0
+            finally:
+                os._exit(status)
+        _, status = os.waitpid(pid, 0)
+        self.assertEqual(os.waitstatus_to_exitcode(status), 0)
+        self.assertIs(self.storage._get_flusher(), parent_flusher)
+        self.assertEqual(self.storage.get_job(job.id).state, "completed")
+
+
+if __name__ == "__main__":
+    unittest.main()
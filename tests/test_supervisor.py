@@ -0,0 +1,137 @@
+from __future__ import annotations
+
+import os
+import sys
+import tempfile
+import time
+import unittest
+from pathlib import Path
+from types import SimpleNamespace
+from unittest import mock
+
+from queuectl.db import get_database
+from queuectl.storage import Storage
+from queuectl.supervisor import Scaler, Supervisor
+
+
+class SupervisorTestCase(unittest.TestCase):
+    def setUp(self):
+        # Forked workers open queuectl.db in the working directory.
+        # Cleanups rather than tearDown, so a test's own cleanups (stopping
+        # its supervisor) run while the database still exists.
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.addCleanup(os.chdir, os.getcwd())
+        os.chdir(tmp.name)
+        self.db = get_database(Path(tmp.name) / "queuectl.db")
+        self.addCleanup(self.db.close)
+        self.storage = Storage(self.db)
+
+    def enqueue(self, count: int) -> None:
+        self.storage.enqueue_many({"command": "true"} for _ in range(count))
+
+
+class ScalerTests(SupervisorTestCase):
+    def setUp(self):
+        super().setUp()
+        for key, value in [("min_workers", "1"), ("max_workers", "3"), ("scale_up_threshold", "5"), ("idle_ttl", "30")]:
+            self.storage.set_config(key, value)
+        self.supervisor = SimpleNamespace(storage=self.storage, active_count=1)
+        self.scaler = Scaler(self.supervisor)
+        self.now = 1000.0
+        patcher = mock.patch("queuectl.supervisor.time.monotonic", lambda: self.now)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_scales_up_one_worker_at_a_time_past_the_threshold(self):
+        self.enqueue(5)
+        self.assertEqual(self.scaler.target(), 1)
+        self.enqueue(1)
+        self.assertEqual(self.scaler.target(), 2)
+        self.supervisor.active_count = 2
+        self.enqueue(5)
+        self.assertEqual(self.scaler.target(), 3)
+
+    def test_never_exceeds_max_workers(self):
+        self.enqueue(100)
+        self.supervisor.active_count = 3
+        self.assertEqual(self.scaler.target(), 3)
+
+    def test_scheduled_jobs_do_not_count(self):
+        self.storage.enqueue_many(
+            {"command": "true", "available_at": "2999-01-01T00:00:00Z"} for _ in range(20)
+        )
+        self.assertEqual(self.scaler.target(), 1)
+
+    def test_parks_one_worker_per_idle_ttl(self):
+        self.supervisor.active_count = 3
+        self.assertEqual(self.scaler.target(), 3)
+        self.now += 29
+        self.assertEqual(self.scaler.target(), 3)
+        self.now += 1
+        self.assertEqual(self.scaler.target(), 2)
+        self.supervisor.active_count = 2
+        self.now += 30
+        self.assertEqual(self.scaler.target(), 1)
+        self.supervisor.active_count = 1
+        self.now += 30
+        self.assertEqual(self.scaler.target(), 1)
+
+    def test_work_resets_the_idle_timer(self):
+        self.supervisor.active_count = 2
+        self.assertEqual(self.scaler.target(), 2)
+        self.now += 20
+        self.enqueue(1)
+        self.assertEqual(self.scaler.target(), 2)
+        self.storage.acquire_jobs(1)
+        self.now += 20
+        self.assertEqual(self.scaler.target(), 2)
+        self.now += 30
+        self.assertEqual(self.scaler.target(), 1)
+
+
+@unittest.skipIf(sys.platform == "win32", "the pool is forked")
+class SupervisorPoolTests(SupervisorTestCase):
+    def wait_for(self, condition, timeout: float = 20.0) -> None:
+        deadline = time.monotonic() + timeout
+        while not condition():
+            if time.monotonic() > deadline:
+                self.fail(f"condition not met within {timeout:.0f}s")
+            time.sleep(0.05)
+
+    def states(self) -> list:
+        return sorted(worker["state"] for worker in self.storage.list_workers())
+
+    def test_surplus_workers_are_parked_and_reused(self):
+        supervisor = Supervisor(self.storage)
+        self.addCleanup(supervisor.shutdown)
+        supervisor.scale_workers(2)
+        self.wait_for(lambda: self.states() == ["idle", "idle"])
+        pids = [worker.process.pid for worker in supervisor._workers]
+
+        supervisor.scale_workers(1)
+        self.assertEqual(supervisor.active_count, 1)
+        self.wait_for(lambda: self.states() == ["idle", "parked"])
+
+        supervisor.scale_workers(2)
+        self.assertEqual([worker.process.pid for worker in supervisor._workers], pids)
+        self.wait_for(lambda: self.states() == ["idle", "idle"])
+
+        supervisor.shutdown()
+        self.assertEqual(self.storage.list_workers(), [])
+
+    def test_dead_worker_is_replaced_in_its_slot(self):
+        supervisor = Supervisor(self.storage)
+        self.addCleanup(supervisor.shutdown)
+        supervisor.scale_workers(2)
+        first = supervisor._workers[0]
+        first.process.kill()
+        first.process.join()
+        supervisor.scale_workers(2)
+        self.assertEqual(len(supervisor._workers), 2)
+        self.assertEqual(sorted(worker.index for worker in supervisor._workers), [0, 1])
+        self.assertNotIn(first, supervisor._workers)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,113 @@
+from __future__ import annotations
+
+import asyncio
+import os
+import shutil
+import signal
+import subprocess
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+
+from queuectl.utils import (
+    execute_with_timing,
+    execute_with_timing_async,
+    is_queuectl_process,
+    split_command,
+    terminate_process,
+)
+
+
+@unittest.skipIf(sys.platform == "win32", "direct exec is POSIX-only")
+class SplitCommandTests(unittest.TestCase):
+    def test_plain_command_is_exec_directly(self):
+        args, executable = split_command("echo hello world")
+        self.assertEqual(args, ["echo", "hello", "world"])
+        self.assertEqual(executable, shutil.which("echo"))
+
+    def test_quoted_arguments_are_split_like_the_shell(self):
+        args, _ = split_command("echo 'a b' \"c d\" e")
+        self.assertEqual(args, ["echo", "a b", "c d", "e"])
+
+    def test_shell_syntax_needs_the_shell(self):
+        for command in ("echo a | cat", "echo $HOME", "ls *.py", "a && b", "echo hi > out"):
+            with self.subTest(command=command):
+                self.assertIsNone(split_command(command))
+
+    def test_builtins_assignments_and_unknown_programs_need_the_shell(self):
+        for command in ("exit 3", "cd /tmp", "FOO=1 env", "no-such-program-queuectl", "", "'unterminated"):
+            with self.subTest(command=command):
+                self.assertIsNone(split_command(command))
+
+
+@unittest.skipIf(sys.platform == "win32", "direct exec is POSIX-only")
+class ShellFallbackTests(unittest.TestCase):
+    def setUp(self):
+        # An executable script without a shebang: execve() rejects it, sh runs it.
+        self.tmp = tempfile.TemporaryDirectory()
+        script = Path(self.tmp.name) / "noshebang"
+        script.write_text("echo from-script\n")
+        script.chmod(0o755)
+        self.old_path = os.environ["PATH"]
+        os.environ["PATH"] = f"{self.tmp.name}{os.pathsep}{self.old_path}"
+
+    def tearDown(self):
+        os.environ["PATH"] = self.old_path
+        self.tmp.cleanup()
+
+    def test_exec_format_error_falls_back_to_the_shell(self):
+        self.assertIsNotNone(split_command("noshebang"))
+        result = execute_with_timing("noshebang")
+        self.assertEqual(result.exit_code, 0)
+        self.assertEqual(result.stdout, "from-script\n")
+
+    def test_async_exec_format_error_falls_back_to_the_shell(self):
+        result = asyncio.run(execute_with_timing_async("noshebang"))
+        self.assertEqual(result.exit_code, 0)
+        self.assertEqual(result.stdout, "from-script\n")
+
+
+@unittest.skipUnless(os.path.isdir("/proc/self"), "needs /proc")
+class TerminateProcessTests(unittest.TestCase):
+    SCRIPT = "import subprocess; print(flush=True); subprocess.run(['sleep', '30'])"
+
+    def spawn(self, *argv: str) -> subprocess.Popen:
+        # A session of its own, like a detached worker (or a user's shell).
+        proc = subprocess.Popen(
+            [sys.executable, "-c", self.SCRIPT, *argv],
+            stdout=subprocess.PIPE,
+            start_new_session=True,
+        )
+        self.addCleanup(self.reap, proc)
+        # Wait for the exec, so /proc shows this command line, not ours.
+        proc.stdout.readline()
+        return proc
+
+    def reap(self, proc: subprocess.Popen) -> None:
+        if proc.poll() is None:
+            os.killpg(proc.pid, signal.SIGKILL)
+        proc.wait()
+        proc.stdout.close()
+
+    def test_unrelated_group_leader_is_left_alone(self):
+        proc = self.spawn()
+        self.assertIs(is_queuectl_process(proc.pid), False)
+        terminate_process(proc.pid)
+        with self.assertRaises(subprocess.TimeoutExpired):
+            proc.wait(timeout=0.5)
+
+    def test_queuectl_worker_group_is_killed(self):
+        proc = self.spawn("queuectl")
+        self.assertIs(is_queuectl_process(proc.pid), True)
+        terminate_process(proc.pid)
+        self.assertEqual(proc.wait(timeout=10), -signal.SIGKILL)
+
+    def test_exited_pid_is_not_a_worker(self):
+        proc = subprocess.Popen([sys.executable, "-c", "pass", "queuectl"])
+        proc.wait()
+        self.assertIs(is_queuectl_process(proc.pid), False)
+
+
+if __name__ == "__main__":
+    unittest.main()
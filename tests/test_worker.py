@@ -0,0 +1,170 @@
+from __future__ import annotations
+
+import collections
+import tempfile
+import threading
+import time
+import unittest
+from pathlib import Path
+from unittest import mock
+
+from queuectl.db import get_database
+from queuectl.storage import Storage
+from queuectl.worker import AsyncWorkerRunner, WorkerConfig, WorkerPool, WorkerRunner, parse_affinity
+
+
+WAIT_TIMEOUT = 20.0
+
+
+class WorkerTestCase(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.db = get_database(Path(self.tmp.name) / "queuectl.db")
+        self.storage = Storage(self.db)
+
+    def tearDown(self):
+        self.db.close()
+        self.tmp.cleanup()
+
+    def config(self, **overrides) -> WorkerConfig:
+        values = dict(poll_interval=0.05, backoff_base=0, command_timeout=None, max_poll_interval=0.05)
+        values.update(overrides)
+        return WorkerConfig(**values)
+
+    def start(self, runner: WorkerRunner) -> threading.Thread:
+        thread = threading.Thread(target=runner.run, daemon=True)
+        thread.start()
+        self.addCleanup(self.stop, runner, thread)
+        return thread
+
+    def stop(self, runner: WorkerRunner, thread: threading.Thread) -> None:
+        runner.request_stop()
+        thread.join(WAIT_TIMEOUT)
+        self.assertFalse(thread.is_alive(), "worker did not stop")
+
+    def wait_for(self, condition, timeout: float = WAIT_TIMEOUT) -> None:
+        deadline = time.monotonic() + timeout
+        while not condition():
+            if time.monotonic() > deadline:
+                self.fail(f"condition not met within {timeout:.0f}s")
+            time.sleep(0.02)
+
+    def summary(self) -> dict:
+        return self.storage.job_summary()
+
+    def count_results(self) -> collections.Counter:
+        # Every mark_completed()/mark_failed() call, by job id.
+        counts: collections.Counter = collections.Counter()
+        mark_completed, mark_failed = self.storage.mark_completed, self.storage.mark_failed
+
+        def _completed(job_id, output):
+            counts[job_id] += 1
+            mark_completed(job_id, output)
+
+        def _failed(job, **kwargs):
+            counts[job.id] += 1
+            mark_failed(job, **kwargs)
+
+        self.storage.mark_completed = _completed
+        self.storage.mark_failed = _failed
+        return counts
+
+
+class RunnerBehaviour:
+    # Shared by the thread-pool and asyncio runners.
+    runner_cls = WorkerRunner
+
+    def runner(self, **overrides) -> WorkerRunner:
+        return self.runner_cls(self.storage, config=self.config(**overrides))
+
+    def test_every_result_is_recorded_exactly_once(self):
+        counts = self.count_results()
+        self.storage.enqueue_many({"id": f"job-{i}", "command": f"echo {i}"} for i in range(20))
+        self.storage.enqueue({"id": "fails", "command": "false", "max_retries": 1})
+        self.start(self.runner(concurrency=4))
+        self.wait_for(lambda: self.summary()["completed"] == 20 and self.summary()["dead"] == 1)
+        self.assertEqual(set(counts.values()), {1})
+        self.assertEqual(len(counts), 21)
+        for i in range(20):
+            job = self.storage.get_job(f"job-{i}")
+            self.assertEqual((job.attempts, job.output), (1, f"{i}\n"))
+
+    def test_stop_drains_running_jobs_and_claims_no_more(self):
+        self.storage.enqueue_many({"id": f"slow-{i}", "command": "sleep 1"} for i in range(2))
+        runner = self.runner(concurrency=2)
+        thread = self.start(runner)
+        self.wait_for(lambda: self.summary()["processing"] == 2)
+        self.storage.enqueue_many({"id": f"late-{i}", "command": "true"} for i in range(2))
+        self.stop(runner, thread)
+        summary = self.summary()
+        self.assertEqual((summary["completed"], summary["pending"], summary["processing"]), (2, 2, 0))
+        self.assertEqual(self.storage.list_workers(), [])
+
+    def test_stop_interrupts_an_idle_wait(self):
+        runner = self.runner(poll_interval=30, max_poll_interval=30)
+        thread = self.start(runner)
+        self.wait_for(lambda: self.storage.list_workers() and self.storage.list_workers()[0]["state"] == "idle")
+        started = time.monotonic()
+        self.stop(runner, thread)
+        self.assertLess(time.monotonic() - started, 1.0)
+
+    def test_enqueue_from_another_storage_ends_an_idle_wait(self):
+        self.start(self.runner(poll_interval=30, max_poll_interval=30))
+        self.wait_for(lambda: self.storage.list_workers() and self.storage.list_workers()[0]["state"] == "idle")
+        time.sleep(0.2)
+        # As another process would: its own Storage, sharing only the files.
+        Storage(get_database(self.db.db_path)).enqueue({"id": "late", "command": "true"})
+        self.wait_for(lambda: self.summary()["completed"] == 1, timeout=5.0)
+
+
+class WorkerRunnerTests(RunnerBehaviour, WorkerTestCase):
+    runner_cls = WorkerRunner
+
+
+class AsyncWorkerRunnerTests(RunnerBehaviour, WorkerTestCase):
+    runner_cls = AsyncWorkerRunner
+
+
+class IdleBackoffTests(WorkerTestCase):
+    def test_backoff_starts_low_and_doubles_up_to_the_cap(self):
+        runner = WorkerRunner(self.storage, config=self.config(poll_interval=2.0, max_poll_interval=2.0))
+        for misses, base in [(0, 0.5), (1, 1.0), (2, 2.0), (3, 2.0), (32, 2.0)]:
+            runner._idle_misses = misses
+            for _ in range(20):
+                with self.subTest(misses=misses):
+                    self.assertTrue(base * 0.75 <= runner._idle_delay() <= base * 1.25)
+
+    def test_empty_polls_count_as_misses(self):
+        runner = WorkerRunner(self.storage, config=self.config())
+        self.start(runner)
+        self.wait_for(lambda: runner._idle_misses >= 3)
+        self.storage.enqueue({"id": "job", "command": "true"})
+        self.wait_for(lambda: self.summary()["completed"] == 1)
+        self.assertLess(runner._idle_misses, 3)
+
+
+class AffinityTests(WorkerTestCase):
+    def test_parse_affinity(self):
+        self.assertEqual(parse_affinity(None), ())
+        self.assertEqual(parse_affinity(" "), ())
+        self.assertEqual(parse_affinity("0,2,3"), (0, 2, 3))
+        for value in ("0,x", "1,", "-1"):
+            with self.subTest(value=value):
+                with self.assertRaises(ValueError):
+                    parse_affinity(value)
+
+    def test_worker_index_picks_the_cpu(self):
+        config = self.config(cpu_affinity=(4, 5, 6))
+        pinned = []
+        with mock.patch("os.sched_setaffinity", lambda pid, cpus: pinned.append(cpus), create=True):
+            for index in range(5):
+                WorkerRunner(self.storage, config=config, index=index)._pin_cpu()
+        self.assertEqual(pinned, [{4}, {5}, {6}, {4}, {5}])
+
+    def test_pool_numbers_its_workers(self):
+        pool = WorkerPool(3, storage=self.storage)
+        self.assertEqual([runner.index for runner in pool.runners], [0, 1, 2])
+
+
+if __name__ == "__main__":
+    unittest.main()